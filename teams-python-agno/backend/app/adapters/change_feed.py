@@ -0,0 +1,197 @@
+"""
+Change Feed - Notificações de invalidação entre workers
+Arquivo append-only com um evento JSON por linha: quem altera estado compartilhado
+(índices FAISS, caches) publica; cada worker acompanha o arquivo e aplica só os eventos
+dos outros processos
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
+
+import asyncio
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+from shared.config import settings, DATA_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# handler(key, evento); key None = o feed foi rotacionado e o estado local deve ser descartado
+Handler = Callable[[Optional[str], Dict], None]
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Lock exclusivo entre processos (bloqueante) sobre um arquivo de lock"""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ChangeFeed:
+    """Publica e acompanha eventos de invalidação (topic, key) entre processos"""
+    
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        poll_interval: Optional[float] = None,
+        max_bytes: Optional[int] = None
+    ):
+        self.path = path or DATA_DIR / "changes.feed"
+        self.lock_path = self.path.with_suffix(".lock")
+        self.poll_interval = poll_interval or settings.change_feed_poll_interval
+        self.max_bytes = max_bytes or settings.change_feed_max_bytes
+        
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._task: Optional[asyncio.Task] = None
+        
+        self.published = 0
+        self.received = 0
+        self.resets = 0
+    
+    def subscribe(self, topic: str, handler: Handler):
+        """Registra um handler síncrono (roda no event loop, deve ser barato)"""
+        self._handlers.setdefault(topic, []).append(handler)
+    
+    async def publish(self, topic: str, key: str, **data):
+        """
+        Acrescenta um evento ao feed (os handlers deste processo não são chamados)
+        Lock entre processos e escrita rodam em thread, fora do event loop
+        """
+        line = json.dumps({"topic": topic, "key": key, "pid": os.getpid(), "ts": time.time(), **data})
+        await asyncio.to_thread(self._append, line)
+        self.published += 1
+    
+    def _append(self, line: str):
+        with file_lock(self.lock_path):
+            # Rotação: arquivo novo (inode novo) avisa os leitores para descartar tudo
+            try:
+                if self.path.stat().st_size > self.max_bytes:
+                    tmp_path = self.path.with_suffix(".tmp")
+                    tmp_path.write_bytes(b"")
+                    tmp_path.replace(self.path)
+            except FileNotFoundError:
+                pass
+            
+            with open(self.path, "ab") as f:
+                f.write(line.encode("utf-8") + b"\n")
+    
+    def _read(self) -> Tuple[bool, List[Dict]]:
+        """Lê as linhas novas desde a última leitura (roda em thread): (feed rotacionado, eventos)"""
+        rotated = False
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return rotated, []
+        
+        with f:
+            stat = os.fstat(f.fileno())
+            if stat.st_ino != self._inode or stat.st_size < self._offset:
+                rotated = self._inode is not None
+                self._inode = stat.st_ino
+                self._offset = 0
+            
+            if stat.st_size == self._offset:
+                return rotated, []
+            
+            f.seek(self._offset)
+            chunk = f.read(stat.st_size - self._offset)
+        
+        # Só linhas completas; uma escrita em andamento fica para a próxima leitura
+        end = chunk.rfind(b"\n") + 1
+        self._offset += end
+        
+        own_pid = os.getpid()
+        events = []
+        for raw in chunk[:end].splitlines():
+            try:
+                event = json.loads(raw)
+            except ValueError:
+                continue
+            if event.get("pid") != own_pid:
+                events.append(event)
+        return rotated, events
+    
+    def _dispatch(self, rotated: bool, events: List[Dict]):
+        """Chama os handlers no event loop"""
+        if rotated:
+            self.resets += 1
+            for handlers in self._handlers.values():
+                for handler in handlers:
+                    handler(None, {})
+        
+        for event in events:
+            self.received += 1
+            for handler in self._handlers.get(event.get("topic"), []):
+                handler(event.get("key"), event)
+    
+    async def poll(self):
+        """Lê os eventos novos (I/O em thread) e chama os handlers"""
+        self._dispatch(*await asyncio.to_thread(self._read))
+    
+    async def start(self):
+        """Começa a acompanhar o feed a partir do fim (eventos antigos já estão refletidos no disco)"""
+        if self._task is not None:
+            return
+        
+        # Arquivo criado aqui: uma rotação antes da primeira leitura também é detectada
+        stat = await asyncio.to_thread(self._touch)
+        self._inode, self._offset = stat.st_ino, stat.st_size
+        
+        self._task = asyncio.create_task(self._run())
+    
+    def _touch(self) -> os.stat_result:
+        self.path.touch(exist_ok=True)
+        return self.path.stat()
+    
+    async def stop(self):
+        if self._task is None:
+            return
+        
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"❌ Erro ao ler change feed: {e}")
+    
+    def stats(self) -> Dict:
+        return {
+            "pid": os.getpid(),
+            "published": self.published,
+            "received": self.received,
+            "resets": self.resets,
+            "offset": self._offset
+        }
+
+
+# Instância global
+change_feed = ChangeFeed()
@@ -0,0 +1,155 @@
+"""
+HTTP Client compartilhado - Pool de conexões único para todos os provedores
+Evita handshakes TLS repetidos entre ChatAgent, adaptadores LLM e RAG
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
+
+import asyncio
+from typing import Optional, TYPE_CHECKING
+import httpx
+from shared.config import Settings
+
+if TYPE_CHECKING:
+    from openai import AsyncAzureOpenAI, AsyncOpenAI
+
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+
+# Instâncias globais (lazy loaded)
+_http_client: Optional[httpx.AsyncClient] = None
+_openai_client: Optional["AsyncOpenAI"] = None
+_azure_openai_client: Optional["AsyncAzureOpenAI"] = None
+
+
+def _default_settings(settings: Settings = None) -> Settings:
+    if settings is None:
+        from shared.config import settings as default_settings
+        settings = default_settings
+    return settings
+
+
+def get_http_client(settings: Settings = None) -> httpx.AsyncClient:
+    """Obtém o httpx.AsyncClient compartilhado (HTTP/2 + keep-alive)"""
+    global _http_client
+    
+    if _http_client is None or _http_client.is_closed:
+        settings = _default_settings(settings)
+        _http_client = httpx.AsyncClient(
+            http2=settings.http_enable_http2,
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections,
+                keepalive_expiry=settings.http_keepalive_expiry
+            ),
+            timeout=httpx.Timeout(settings.http_timeout, connect=settings.http_connect_timeout)
+        )
+    
+    return _http_client
+
+
+def get_openai_client(settings: Settings = None) -> "AsyncOpenAI":
+    """Obtém o cliente OpenAI que usa o pool compartilhado"""
+    global _openai_client
+    
+    if _openai_client is None:
+        # Import tardio: o SDK da OpenAI só é carregado no primeiro uso
+        from openai import AsyncOpenAI
+        
+        settings = _default_settings(settings)
+        _openai_client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            http_client=get_http_client(settings)
+        )
+    
+    return _openai_client
+
+
+def get_azure_openai_client(settings: Settings = None) -> "AsyncAzureOpenAI":
+    """Obtém o cliente Azure OpenAI que usa o pool compartilhado"""
+    global _azure_openai_client
+    
+    if _azure_openai_client is None:
+        from openai import AsyncAzureOpenAI
+        
+        settings = _default_settings(settings)
+        _azure_openai_client = AsyncAzureOpenAI(
+            api_key=settings.azure_openai_api_key,
+            api_version=settings.azure_openai_api_version,
+            azure_endpoint=settings.azure_openai_endpoint,
+            http_client=get_http_client(settings)
+        )
+    
+    return _azure_openai_client
+
+
+def create_openai_client(
+    api_key: str,
+    base_url: Optional[str] = None,
+    settings: Settings = None
+) -> "AsyncOpenAI":
+    """Cria cliente OpenAI (ou compatível) com chave/URL próprias, no mesmo pool"""
+    from openai import AsyncOpenAI
+    
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=get_http_client(settings)
+    )
+
+
+def create_azure_openai_client(
+    azure_endpoint: str,
+    api_key: str,
+    api_version: str,
+    settings: Settings = None
+) -> "AsyncAzureOpenAI":
+    """Cria cliente Azure OpenAI para um deployment específico, no mesmo pool"""
+    from openai import AsyncAzureOpenAI
+    
+    return AsyncAzureOpenAI(
+        api_key=api_key,
+        api_version=api_version,
+        azure_endpoint=azure_endpoint,
+        http_client=get_http_client(settings)
+    )
+
+
+async def warm_up_connections(settings: Settings = None):
+    """
+    Abre conexões com os provedores antes da primeira requisição
+    O status da resposta não importa: o objetivo é deixar TCP/TLS prontos no pool
+    """
+    settings = _default_settings(settings)
+    client = get_http_client(settings)
+    
+    urls = [OPENAI_BASE_URL]
+    if getattr(settings, "use_azure", False):
+        urls = [settings.azure_openai_endpoint]
+    
+    async def _touch(url: str):
+        try:
+            await client.head(url)
+        except httpx.HTTPError as e:
+            print(f"⚠️ Warm-up falhou para {url}: {e}")
+    
+    await asyncio.gather(*(
+        _touch(url)
+        for url in urls
+        for _ in range(settings.http_warmup_connections)
+    ))
+    print(f"🔥 Conexões aquecidas: {', '.join(urls)}")
+
+
+async def close_http_client():
+    """Fecha o pool compartilhado"""
+    global _http_client, _openai_client, _azure_openai_client
+    
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    
+    _http_client = None
+    _openai_client = None
+    _azure_openai_client = None
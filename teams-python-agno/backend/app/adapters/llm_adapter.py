@@ -6,10 +6,88 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
 
+import asyncio
+import json
+import time
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional, Union
-from openai import AsyncAzureOpenAI, AsyncOpenAI
+from collections import deque
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
 from shared.config import Settings
+from app.adapters.http_client import (
+    get_openai_client,
+    get_azure_openai_client,
+    create_openai_client,
+    create_azure_openai_client,
+)
+from app.adapters.single_flight import SingleFlight
+from app.adapters.micro_batcher import EmbeddingMicroBatcher
+
+
+def _usage(usage) -> Dict:
+    """Uso de tokens da resposta, incluindo tokens de prompt servidos pelo cache do provedor"""
+    if usage is None:
+        return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_tokens": 0}
+    
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "completion_tokens": usage.completion_tokens or 0,
+        "total_tokens": usage.total_tokens or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0
+    }
+
+
+@lru_cache(maxsize=None)
+def _token_counter(model: str):
+    """Tokenizer local do modelo (tiktoken, com fallback por caracteres do ContextPacker)"""
+    from app.services.context_packer import ContextPacker
+    return ContextPacker(model=model)
+
+
+def _estimate_usage(model: str, messages: List[Dict[str, str]], content: str) -> Dict:
+    """Uso de tokens contado localmente (o streaming não traz usage); roda em thread"""
+    counter = _token_counter(model)
+    # ~4 tokens de formatação por mensagem + 3 do início da resposta (formato de chat da OpenAI)
+    prompt_tokens = sum(counter.count_tokens(m.get("content") or "") + 4 for m in messages) + 3
+    completion_tokens = counter.count_tokens(content)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "cached_tokens": 0,
+        "estimated": True
+    }
+
+
+async def _stream_chat(client, model: str, messages: List[Dict[str, str]], **kwargs) -> Dict:
+    """
+    Chat em streaming: mesmo formato do chat_completion e o instante do primeiro token
+    (first_token_at, em time.perf_counter) para medir o time-to-first-token
+    """
+    stream = await client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+    
+    parts = []
+    first_token_at = None
+    finish_reason = None
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        if choice.delta.content:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            parts.append(choice.delta.content)
+        finish_reason = choice.finish_reason or finish_reason
+    
+    content = "".join(parts)
+    return {
+        "content": content,
+        "model": model,
+        "usage": await asyncio.to_thread(_estimate_usage, model, messages, content),
+        "finish_reason": finish_reason,
+        "first_token_at": first_token_at
+    }
 
 
 class BaseLLMAdapter(ABC):
@@ -40,17 +118,35 @@ class BaseLLMAdapter(ABC):
 class AzureOpenAIAdapter(BaseLLMAdapter):
     """Adaptador para Azure OpenAI (Corporativo)"""
     
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, deployment: Optional[Dict] = None):
         self.settings = settings
-        self.client = AsyncAzureOpenAI(
-            api_key=settings.azure_openai_api_key,
-            api_version=settings.azure_openai_api_version,
-            azure_endpoint=settings.azure_openai_endpoint
+        
+        if deployment:
+            # Deployment específico (ex.: uma região usada pelo roteador)
+            endpoint = deployment["endpoint"]
+            self.client = create_azure_openai_client(
+                azure_endpoint=endpoint,
+                api_key=deployment.get("api_key", settings.azure_openai_api_key),
+                api_version=deployment.get("api_version", settings.azure_openai_api_version),
+                settings=settings
+            )
+            self.chat_deployment = deployment.get("chat_deployment", settings.azure_chat_deployment)
+            self.embedding_deployment = deployment.get("embedding_deployment", settings.azure_embedding_deployment)
+        else:
+            endpoint = settings.azure_openai_endpoint
+            self.client = get_azure_openai_client(settings)
+            self.chat_deployment = settings.azure_chat_deployment
+            self.embedding_deployment = settings.azure_embedding_deployment
+        
+        # Azure OpenAI suporta até 16 inputs por request
+        self.embedding_batcher = EmbeddingMicroBatcher(
+            self._embed_texts,
+            max_batch_size=min(settings.embedding_batch_max_size, 16),
+            max_wait=settings.embedding_batch_max_wait_ms / 1000
         )
-        self.chat_deployment = settings.azure_chat_deployment
-        self.embedding_deployment = settings.azure_embedding_deployment
+        
         print(f"✅ Azure OpenAI Adapter inicializado")
-        print(f"   Endpoint: {settings.azure_openai_endpoint}")
+        print(f"   Endpoint: {endpoint}")
         print(f"   Chat Model: {self.chat_deployment}")
         print(f"   Embedding Model: {self.embedding_deployment}")
     
@@ -61,10 +157,17 @@ class AzureOpenAIAdapter(BaseLLMAdapter):
         max_tokens: int = 1000,
         **kwargs
     ) -> Dict:
-        """Gera resposta usando Azure OpenAI"""
+        """Gera resposta usando Azure OpenAI (model= sobrescreve o deployment padrão)"""
+        model = kwargs.pop("model", None) or self.chat_deployment  # Nome do deployment no Azure
         try:
+            if kwargs.pop("stream", False):
+                # Streaming: permite medir o time-to-first-token (uso de tokens contado localmente)
+                return await _stream_chat(
+                    self.client, model, messages, temperature=temperature, max_tokens=max_tokens, **kwargs
+                )
+            
             response = await self.client.chat.completions.create(
-                model=self.chat_deployment,  # Nome do deployment no Azure
+                model=model,
                 messages=messages,
                 temperature=temperature,
                 max_tokens=max_tokens,
@@ -73,26 +176,26 @@ class AzureOpenAIAdapter(BaseLLMAdapter):
             
             return {
                 "content": response.choices[0].message.content,
-                "model": self.chat_deployment,
-                "usage": {
-                    "prompt_tokens": response.usage.prompt_tokens if response.usage else 0,
-                    "completion_tokens": response.usage.completion_tokens if response.usage else 0,
-                    "total_tokens": response.usage.total_tokens if response.usage else 0
-                },
+                "model": model,
+                "usage": _usage(response.usage),
                 "finish_reason": response.choices[0].finish_reason
             }
         except Exception as e:
             print(f"❌ Erro ao chamar Azure OpenAI: {e}")
             raise
     
+    async def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Uma requisição de embeddings para vários textos"""
+        response = await self.client.embeddings.create(
+            model=self.embedding_deployment,
+            input=texts
+        )
+        return [item.embedding for item in response.data]
+    
     async def generate_embedding(self, text: str) -> List[float]:
-        """Gera embedding usando Azure OpenAI"""
+        """Gera embedding usando Azure OpenAI (micro-batch com chamadas concorrentes)"""
         try:
-            response = await self.client.embeddings.create(
-                model=self.embedding_deployment,
-                input=text
-            )
-            return response.data[0].embedding
+            return await self.embedding_batcher.submit(text)
         except Exception as e:
             print(f"❌ Erro ao gerar embedding: {e}")
             raise
@@ -122,11 +225,27 @@ class AzureOpenAIAdapter(BaseLLMAdapter):
 class OpenAIAdapter(BaseLLMAdapter):
     """Adaptador para OpenAI padrão (Fallback)"""
     
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, deployment: Optional[Dict] = None):
         self.settings = settings
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
-        self.chat_model = settings.openai_chat_model
-        self.embedding_model = settings.openai_embedding_model
+        
+        if deployment:
+            # Endpoint específico do roteador: chave, URL e modelos próprios
+            self.client = create_openai_client(
+                api_key=deployment.get("api_key", settings.openai_api_key),
+                base_url=deployment.get("base_url"),
+                settings=settings
+            )
+            self.chat_model = deployment.get("chat_model", settings.chat_model)
+            self.embedding_model = deployment.get("embedding_model", settings.embedding_model)
+        else:
+            self.client = get_openai_client(settings)
+            self.chat_model = settings.chat_model
+            self.embedding_model = settings.embedding_model
+        self.embedding_batcher = EmbeddingMicroBatcher(
+            self._embed_texts,
+            max_batch_size=settings.embedding_batch_max_size,
+            max_wait=settings.embedding_batch_max_wait_ms / 1000
+        )
         print(f"✅ OpenAI Adapter inicializado")
         print(f"   Chat Model: {self.chat_model}")
         print(f"   Embedding Model: {self.embedding_model}")
@@ -138,10 +257,17 @@ class OpenAIAdapter(BaseLLMAdapter):
         max_tokens: int = 1000,
         **kwargs
     ) -> Dict:
-        """Gera resposta usando OpenAI padrão"""
+        """Gera resposta usando OpenAI padrão (model= sobrescreve o modelo padrão)"""
+        model = kwargs.pop("model", None) or self.chat_model
         try:
+            if kwargs.pop("stream", False):
+                # Streaming: permite medir o time-to-first-token (uso de tokens contado localmente)
+                return await _stream_chat(
+                    self.client, model, messages, temperature=temperature, max_tokens=max_tokens, **kwargs
+                )
+            
             response = await self.client.chat.completions.create(
-                model=self.chat_model,
+                model=model,
                 messages=messages,
                 temperature=temperature,
                 max_tokens=max_tokens,
@@ -150,26 +276,26 @@ class OpenAIAdapter(BaseLLMAdapter):
             
             return {
                 "content": response.choices[0].message.content,
-                "model": self.chat_model,
-                "usage": {
-                    "prompt_tokens": response.usage.prompt_tokens if response.usage else 0,
-                    "completion_tokens": response.usage.completion_tokens if response.usage else 0,
-                    "total_tokens": response.usage.total_tokens if response.usage else 0
-                },
+                "model": model,
+                "usage": _usage(response.usage),
                 "finish_reason": response.choices[0].finish_reason
             }
         except Exception as e:
             print(f"❌ Erro ao chamar OpenAI: {e}")
             raise
     
+    async def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Uma requisição de embeddings para vários textos"""
+        response = await self.client.embeddings.create(
+            model=self.embedding_model,
+            input=texts
+        )
+        return [item.embedding for item in response.data]
+    
     async def generate_embedding(self, text: str) -> List[float]:
-        """Gera embedding usando OpenAI"""
+        """Gera embedding usando OpenAI (micro-batch com chamadas concorrentes)"""
         try:
-            response = await self.client.embeddings.create(
-                model=self.embedding_model,
-                input=text
-            )
-            return response.data[0].embedding
+            return await self.embedding_batcher.submit(text)
         except Exception as e:
             print(f"❌ Erro ao gerar embedding: {e}")
             raise
@@ -196,16 +322,305 @@ class OpenAIAdapter(BaseLLMAdapter):
         return all_embeddings
 
 
+def _is_retryable(error: Exception) -> bool:
+    """Erros que justificam tentar outro endpoint (429, 5xx, timeout, conexão)"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError)) or \
+        type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+class EndpointStats:
+    """
+    Latência (EWMA + janela para p95) e taxa de erro de um endpoint
+    A taxa de erro decai com o tempo (meia-vida = cooldown): um endpoint que passou do
+    limite volta a ser candidato a primário depois que os erros envelhecem
+    """
+    
+    def __init__(self, alpha: float, window: int = 200, error_half_life: float = 30.0):
+        self.alpha = alpha
+        self.error_half_life = error_half_life
+        self.ewma_latency: Optional[float] = None
+        self.latencies = deque(maxlen=window)
+        self.cooldown_until = 0.0
+        
+        self._error_rate = 0.0
+        self._error_at = time.monotonic()
+    
+    @property
+    def error_rate(self) -> float:
+        """Taxa de erro atual, com o decaimento desde a última atualização"""
+        if self.error_half_life <= 0:
+            return self._error_rate
+        elapsed = time.monotonic() - self._error_at
+        return self._error_rate * 0.5 ** (elapsed / self.error_half_life)
+    
+    def _set_error_rate(self, value: float):
+        self._error_rate = value
+        self._error_at = time.monotonic()
+    
+    def record_success(self, latency: float):
+        self.latencies.append(latency)
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = self.alpha * latency + (1 - self.alpha) * self.ewma_latency
+        self._set_error_rate((1 - self.alpha) * self.error_rate)
+    
+    def record_cancelled(self, elapsed: float):
+        """
+        Chamada cancelada (hedge venceu ou cliente desistiu): elapsed é só um limite inferior
+        da latência. Acima da média ele piora a estimativa; abaixo não diz nada
+        """
+        if self.ewma_latency is None or elapsed > self.ewma_latency:
+            self.latencies.append(elapsed)
+            if self.ewma_latency is None:
+                self.ewma_latency = elapsed
+            else:
+                self.ewma_latency = self.alpha * elapsed + (1 - self.alpha) * self.ewma_latency
+    
+    def record_error(self, cooldown: float = 0.0):
+        self._set_error_rate(self.alpha + (1 - self.alpha) * self.error_rate)
+        if cooldown:
+            self.cooldown_until = time.monotonic() + cooldown
+    
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < 20:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+    
+    def is_healthy(self, max_error_rate: float) -> bool:
+        return time.monotonic() >= self.cooldown_until and self.error_rate < max_error_rate
+
+
+class RoutingLLMAdapter(BaseLLMAdapter):
+    """
+    Roteia entre vários deployments: escolhe o mais rápido saudável,
+    dispara requisição de hedge após o p95 e faz failover em 429/5xx
+    """
+    
+    def __init__(self, settings: Settings, adapters: Dict[str, BaseLLMAdapter]):
+        self.settings = settings
+        self.adapters = adapters
+        self.stats = {
+            name: EndpointStats(
+                alpha=settings.llm_router_ewma_alpha,
+                error_half_life=settings.llm_router_cooldown
+            )
+            for name in adapters
+        }
+        print(f"✅ Routing LLM Adapter inicializado: {', '.join(adapters)}")
+    
+    def _ranked_endpoints(self) -> List[str]:
+        """Endpoints saudáveis primeiro, ordenados por latência EWMA"""
+        max_error_rate = self.settings.llm_router_max_error_rate
+        
+        def _key(name: str):
+            stats = self.stats[name]
+            # Endpoint sem histórico entra na frente para ser medido
+            latency = stats.ewma_latency if stats.ewma_latency is not None else 0.0
+            return (not stats.is_healthy(max_error_rate), latency)
+        
+        return sorted(self.adapters, key=_key)
+    
+    async def _call(self, name: str, method: str, *args, **kwargs):
+        """Executa a chamada em um endpoint registrando latência e erros"""
+        stats = self.stats[name]
+        start = time.perf_counter()
+        try:
+            result = await getattr(self.adapters[name], method)(*args, **kwargs)
+        except asyncio.CancelledError:
+            # Sem isso um endpoint lento, sempre cancelado pelo hedge, continuaria em primeiro
+            stats.record_cancelled(time.perf_counter() - start)
+            raise
+        except Exception as e:
+            cooldown = self.settings.llm_router_cooldown if _is_retryable(e) else 0.0
+            stats.record_error(cooldown)
+            raise
+        stats.record_success(time.perf_counter() - start)
+        return result
+    
+    def _hedge_delay(self, name: str) -> float:
+        p95 = self.stats[name].p95()
+        return p95 if p95 is not None else self.settings.llm_router_hedge_default
+    
+    async def _call_with_hedge(self, primary: str, backup: Optional[str], method: str, *args, **kwargs):
+        """Chama o primário; se passar do p95, dispara o backup e usa quem responder primeiro"""
+        primary_task = asyncio.create_task(self._call(primary, method, *args, **kwargs))
+        if backup is None:
+            return await primary_task
+        
+        done, _ = await asyncio.wait({primary_task}, timeout=self._hedge_delay(primary))
+        if done:
+            return primary_task.result()
+        
+        backup_task = asyncio.create_task(self._call(backup, method, *args, **kwargs))
+        pending = {primary_task, backup_task}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def _route(self, method: str, *args, hedge: bool = False, **kwargs):
+        """Tenta os endpoints em ordem, com failover em erros recuperáveis"""
+        ranked = self._ranked_endpoints()
+        tried = set()
+        last_error = None
+        
+        for i, name in enumerate(ranked):
+            if name in tried:
+                continue
+            # Backup do hedge: próximo endpoint ainda não tentado
+            untried = [other for other in ranked[i + 1:] if other not in tried]
+            backup = untried[0] if hedge and untried else None
+            tried.add(name)
+            if backup is not None:
+                tried.add(backup)
+            try:
+                return await self._call_with_hedge(name, backup, method, *args, **kwargs)
+            except Exception as e:
+                if not _is_retryable(e):
+                    raise
+                last_error = e
+                print(f"⚠️ Endpoint {name} falhou ({e}), tentando próximo")
+        
+        raise last_error
+    
+    async def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        **kwargs
+    ) -> Dict:
+        """Gera resposta no endpoint mais rápido, com hedge e failover"""
+        return await self._route(
+            "chat_completion",
+            messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            hedge=self.settings.llm_router_hedging,
+            **kwargs
+        )
+    
+    async def generate_embedding(self, text: str) -> List[float]:
+        """Gera embedding com failover (todos os deployments devem usar o mesmo modelo)"""
+        return await self._route("generate_embedding", text)
+    
+    async def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        """Gera embeddings em batch com failover"""
+        return await self._route("generate_embeddings_batch", texts)
+    
+    def get_stats(self) -> Dict:
+        """Estado atual de cada endpoint"""
+        return {
+            name: {
+                "ewma_latency": stats.ewma_latency,
+                "p95": stats.p95(),
+                "error_rate": stats.error_rate,
+                "healthy": stats.is_healthy(self.settings.llm_router_max_error_rate)
+            }
+            for name, stats in self.stats.items()
+        }
+
+
+class CoalescingLLMAdapter(BaseLLMAdapter):
+    """Envolve outro adaptador e compartilha chamadas idênticas em andamento"""
+    
+    def __init__(self, adapter: BaseLLMAdapter):
+        self.adapter = adapter
+        self.single_flight = SingleFlight()
+        self.model = getattr(adapter, "chat_model", None) or getattr(adapter, "chat_deployment", None)
+        self.embedding_model = getattr(adapter, "embedding_model", None) or getattr(adapter, "embedding_deployment", None)
+    
+    async def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        **kwargs
+    ) -> Dict:
+        """Gera resposta, reaproveitando uma chamada idêntica em andamento"""
+        key = SingleFlight.make_key("chat", self.model, messages, temperature, max_tokens, kwargs)
+        return await self.single_flight.do(
+            key,
+            lambda: self.adapter.chat_completion(
+                messages, temperature=temperature, max_tokens=max_tokens, **kwargs
+            )
+        )
+    
+    async def generate_embedding(self, text: str) -> List[float]:
+        """Gera embedding, reaproveitando uma chamada idêntica em andamento"""
+        key = SingleFlight.make_key("embedding", self.embedding_model, text)
+        return await self.single_flight.do(key, lambda: self.adapter.generate_embedding(text))
+    
+    async def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        """Gera embeddings em batch, reaproveitando uma chamada idêntica em andamento"""
+        key = SingleFlight.make_key("embeddings_batch", self.embedding_model, texts)
+        return await self.single_flight.do(key, lambda: self.adapter.generate_embeddings_batch(texts))
+    
+    def get_stats(self) -> Dict:
+        """Métricas do single-flight"""
+        return self.single_flight.stats()
+
+
 class LLMAdapterFactory:
     """Factory para criar o adaptador correto"""
     
     @staticmethod
     def create_adapter(settings: Settings) -> BaseLLMAdapter:
         """Cria adaptador baseado na configuração"""
-        if settings.use_azure:
+        if settings.llm_router_endpoints:
+            return LLMAdapterFactory.create_router(settings)
+        elif settings.use_azure:
             return AzureOpenAIAdapter(settings)
         else:
             return OpenAIAdapter(settings)
+    
+    @staticmethod
+    def create_router(settings: Settings) -> RoutingLLMAdapter:
+        """
+        Cria roteador a partir de LLM_ROUTER_ENDPOINTS (lista JSON), ex.:
+        [{"name": "eastus", "provider": "azure", "endpoint": "https://..."}, {"name": "openai", "provider": "openai"}]
+        azure: endpoint, api_key, api_version, chat_deployment, embedding_deployment
+        openai: api_key, base_url, chat_model, embedding_model (ausentes = configuração global)
+        """
+        adapters = {}
+        targets = set()
+        for i, deployment in enumerate(json.loads(settings.llm_router_endpoints)):
+            name = deployment.get("name", f"endpoint-{i}")
+            provider = deployment.get("provider", "azure")
+            
+            # Mesmo destino duas vezes não é redundância: falha e fica lento junto
+            target = (
+                provider,
+                deployment.get("endpoint") if provider == "azure" else deployment.get("base_url"),
+                deployment.get("api_key"),
+                deployment.get("chat_deployment") if provider == "azure" else deployment.get("chat_model")
+            )
+            if name in adapters or target in targets:
+                raise ValueError(f"LLM_ROUTER_ENDPOINTS: endpoint duplicado ({name})")
+            targets.add(target)
+            
+            if provider == "azure":
+                adapters[name] = AzureOpenAIAdapter(settings, deployment)
+            else:
+                adapters[name] = OpenAIAdapter(settings, deployment)
+        
+        if not adapters:
+            raise ValueError("LLM_ROUTER_ENDPOINTS não define nenhum endpoint")
+        
+        return RoutingLLMAdapter(settings, adapters)
 
 
 # Instância global (lazy loaded)
@@ -221,5 +636,18 @@ def get_llm_adapter(settings: Settings = None) -> BaseLLMAdapter:
             from shared.config import settings as default_settings
             settings = default_settings
         _llm_adapter = LLMAdapterFactory.create_adapter(settings)
+        if settings.llm_coalescing_enabled:
+            _llm_adapter = CoalescingLLMAdapter(_llm_adapter)
     
     return _llm_adapter
+
+
+def coalescing_counts() -> Tuple[int, int]:
+    """
+    (chamadas reaproveitadas, chamadas ao provedor) do single-flight do adaptador LLM
+    Lido pelo /metrics: não cria o adaptador se ele ainda não foi usado
+    """
+    if isinstance(_llm_adapter, CoalescingLLMAdapter):
+        stats = _llm_adapter.get_stats()
+        return stats["collapsed"], stats["upstream_calls"]
+    return 0, 0
@@ -0,0 +1,90 @@
+"""
+Micro-batcher - Junta embeddings de queries concorrentes em uma única requisição
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
+
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+
+class EmbeddingMicroBatcher:
+    """
+    Agrupa chamadas de embedding que chegam em poucos milissegundos
+    Adaptativo: sem requisição em andamento, envia na hora (não penaliza o p50);
+    sob carga, acumula até max_batch_size ou max_wait
+    """
+    
+    def __init__(
+        self,
+        batch_fn: Callable[[List[str]], Awaitable[List[List[float]]]],
+        max_batch_size: int = 64,
+        max_wait: float = 0.005
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight = 0
+        # Referências aos batches em andamento (o loop só guarda referências fracas às tasks)
+        self._tasks: Set[asyncio.Task] = set()
+        
+        self.requests = 0
+        self.batches = 0
+    
+    async def submit(self, text: str) -> List[float]:
+        """Enfileira um texto e aguarda seu embedding"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self.requests += 1
+        
+        if self._inflight == 0 or len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        """Dispara o batch acumulado"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            self._inflight += 1
+            self.batches += 1
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]):
+        """Executa o batch e devolve cada embedding ao seu chamador"""
+        try:
+            embeddings = await self.batch_fn([text for text, _ in batch])
+            if len(embeddings) != len(batch):
+                # Sem isso, os chamadores além do tamanho da resposta ficariam esperando para sempre
+                raise ValueError(f"Provedor retornou {len(embeddings)} embeddings para {len(batch)} textos")
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._inflight -= 1
+    
+    def stats(self) -> Dict:
+        """Métricas de agrupamento"""
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0
+        }
@@ -0,0 +1,53 @@
+"""
+Single-flight - Agrupa chamadas idênticas em andamento em uma única chamada upstream
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """
+    Chamadas com a mesma chave enquanto a primeira está em andamento
+    recebem o mesmo resultado (ou a mesma exceção)
+    """
+    
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.collapsed = 0
+    
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Chave estável a partir de modelo, mensagens/texto e parâmetros"""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Executa func uma vez por chave em andamento"""
+        self.calls += 1
+        task = self._inflight.get(key)
+        
+        if task is None:
+            # Task própria: o cancelamento de um chamador não afeta os demais
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.collapsed += 1
+        
+        return await asyncio.shield(task)
+    
+    def stats(self) -> Dict:
+        """Métricas de chamadas agrupadas"""
+        return {
+            "calls": self.calls,
+            "collapsed": self.collapsed,
+            "upstream_calls": self.calls - self.collapsed,
+            "inflight": len(self._inflight)
+        }
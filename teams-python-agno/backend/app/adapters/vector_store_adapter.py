@@ -6,10 +6,14 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
 
+import asyncio
+import json
+import pickle
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 import numpy as np
 from shared.config import Settings
+from app.adapters.change_feed import change_feed, file_lock
 
 
 class BaseVectorStoreAdapter(ABC):
@@ -226,8 +230,9 @@ class FAISSAdapter(BaseVectorStoreAdapter):
             metadatas = []
             
             for idx in indices[0]:
-                if idx < len(self.metadata_store[collection_name]):
-                    meta = self.metadata_store[collection_name][idx]
+                if 0 <= idx < len(self.metadata_store[collection_name]):
+                    # Cópia: o pop abaixo não pode remover o texto do metadado guardado
+                    meta = dict(self.metadata_store[collection_name][idx])
                     documents.append(meta.pop('document', ''))
                     metadatas.append(meta)
             
@@ -297,6 +302,272 @@ class FAISSAdapter(BaseVectorStoreAdapter):
                 self.metadata_store[collection_name] = pickle.load(f)
 
 
+class SharedFAISSAdapter(BaseVectorStoreAdapter):
+    """
+    FAISS compartilhado entre workers (API_WORKERS > 1)
+    Os vetores ficam em arquivos .npy abertos com mmap: o page cache guarda uma única cópia
+    para todos os processos. Gerações são imutáveis; um escritor por vez (lock em arquivo)
+    grava a geração nova e troca o ponteiro {collection}.current; leitores não usam lock
+    e reabrem a collection quando o change feed avisa
+    """
+    
+    CHANGE_TOPIC = "faiss"
+    
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.faiss_path = Path(settings.faiss_index_path)
+        self.faiss_path.mkdir(parents=True, exist_ok=True)
+        
+        # collection -> (geração, vetores mmap somente leitura, metadados)
+        self.views: Dict[str, Tuple[int, np.ndarray, List[Dict]]] = {}
+        
+        self.change_feed = change_feed
+        change_feed.subscribe(self.CHANGE_TOPIC, self._on_change)
+        
+        print(f"✅ FAISS compartilhado (mmap) inicializado: {settings.faiss_index_path}")
+    
+    def _file(self, collection_name: str, suffix: str) -> Path:
+        return self.faiss_path / f"{collection_name}{suffix}"
+    
+    def _on_change(self, collection_name: Optional[str], event: Dict):
+        """Outro worker gravou ou removeu a collection: reabre na próxima busca"""
+        if collection_name is None:
+            self.views.clear()
+        else:
+            self.views.pop(collection_name, None)
+    
+    def _read_current(self, collection_name: str) -> Optional[Dict]:
+        try:
+            return json.loads(self._file(collection_name, ".current").read_text())
+        except FileNotFoundError:
+            return None
+    
+    def _read_generation(self, collection_name: str, generation: int) -> Tuple[np.ndarray, List[Dict]]:
+        vectors = np.load(self._file(collection_name, f".{generation}.npy"), mmap_mode="r")
+        with open(self._file(collection_name, f".{generation}.meta"), "rb") as f:
+            metadata = pickle.load(f)
+        return vectors, metadata
+    
+    def _open(self, collection_name: str) -> Optional[Tuple[int, np.ndarray, List[Dict]]]:
+        """Abre a geração atual; roda em thread"""
+        for _ in range(3):
+            current = self._read_current(collection_name)
+            if current is None:
+                if not self._file(collection_name, ".index").exists():
+                    return None
+                with file_lock(self._file(collection_name, ".lock")):
+                    current = self._read_current(collection_name) or self._convert_legacy(collection_name)
+                if current is None:
+                    return None
+            
+            generation = current["generation"]
+            try:
+                vectors, metadata = self._read_generation(collection_name, generation)
+            except FileNotFoundError:
+                # Geração removida entre a leitura do ponteiro e a abertura: lê o ponteiro de novo
+                continue
+            
+            view = (generation, vectors, metadata)
+            self.views[collection_name] = view
+            return view
+        
+        return None
+    
+    @staticmethod
+    def _write_atomic(path: Path, write):
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            write(f)
+        tmp_path.replace(path)
+    
+    def _commit(self, collection_name: str, generation: int, vectors: np.ndarray, metadata: List[Dict]):
+        """Grava uma geração nova e troca o ponteiro (chamado com o lock do escritor)"""
+        self._write_atomic(self._file(collection_name, f".{generation}.npy"), lambda f: np.save(f, vectors))
+        self._write_atomic(self._file(collection_name, f".{generation}.meta"), lambda f: pickle.dump(metadata, f))
+        # Troca do ponteiro por último: a geração nova só fica visível quando está completa
+        self._write_atomic(self._file(collection_name, ".current"), lambda f: f.write(json.dumps({
+            "generation": generation,
+            "count": len(metadata),
+            "dimension": int(vectors.shape[1])
+        }).encode("utf-8")))
+        
+        # Mantém a geração anterior para leitores que acabaram de ler o ponteiro antigo
+        for path in list(self.faiss_path.glob(f"{collection_name}.*.npy")) + list(self.faiss_path.glob(f"{collection_name}.*.meta")):
+            old = path.name[len(collection_name) + 1:].split(".")[0]
+            if old.isdigit() and int(old) < generation - 1:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass  # Windows: arquivo ainda mapeado por outro processo
+    
+    def _convert_legacy(self, collection_name: str) -> Optional[Dict]:
+        """Converte {collection}.index/.meta do FAISSAdapter em geração 1 (chamado com o lock do escritor)"""
+        import faiss
+        
+        if not self._file(collection_name, ".index").exists():
+            return None
+        
+        index = faiss.read_index(str(self._file(collection_name, ".index")))
+        with open(self._file(collection_name, ".meta"), "rb") as f:
+            metadata = pickle.load(f)
+        self._commit(collection_name, 1, index.reconstruct_n(0, index.ntotal).astype("float32"), metadata)
+        return self._read_current(collection_name)
+    
+    def _append(self, collection_name: str, embeddings: np.ndarray, metadatas: List[Dict]) -> int:
+        """Escritor: geração atual + novos vetores -> geração nova; roda em thread"""
+        with file_lock(self._file(collection_name, ".lock")):
+            current = self._read_current(collection_name) or self._convert_legacy(collection_name)
+            
+            if current is None:
+                generation = 1
+                vectors, metadata = embeddings, metadatas
+            else:
+                generation = current["generation"] + 1
+                old_vectors, old_metadata = self._read_generation(collection_name, current["generation"])
+                if old_vectors.shape[1] != embeddings.shape[1]:
+                    raise ValueError(
+                        f"Dimensão {embeddings.shape[1]} diferente da collection ({old_vectors.shape[1]})"
+                    )
+                vectors = np.concatenate([old_vectors, embeddings])
+                metadata = old_metadata + metadatas
+            
+            self._commit(collection_name, generation, vectors, metadata)
+        
+        return generation
+    
+    def _remove(self, collection_name: str):
+        """Remove o ponteiro e todas as gerações; roda em thread"""
+        with file_lock(self._file(collection_name, ".lock")):
+            # Ponteiro primeiro: leitores deixam de encontrar a collection
+            for path in [self._file(collection_name, ".current")] + list(self.faiss_path.glob(f"{collection_name}.*")):
+                if path.suffix == ".lock":
+                    continue
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+    
+    async def add_documents(
+        self,
+        collection_name: str,
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict],
+        ids: Optional[List[str]] = None
+    ) -> int:
+        """Adiciona documentos gravando uma nova geração da collection"""
+        try:
+            embeddings_array = np.array(embeddings).astype('float32')
+            entries = []
+            for i, doc in enumerate(documents):
+                meta = metadatas[i].copy()
+                meta['document'] = doc
+                entries.append(meta)
+            
+            generation = await asyncio.to_thread(self._append, collection_name, embeddings_array, entries)
+            
+            self.views.pop(collection_name, None)
+            await self.change_feed.publish(self.CHANGE_TOPIC, collection_name, generation=generation)
+            
+            return len(documents)
+        except Exception as e:
+            print(f"❌ Erro ao adicionar ao FAISS compartilhado: {e}")
+            raise
+    
+    async def search_similar(
+        self,
+        collection_name: str,
+        query_embedding: List[float],
+        n_results: int = 5,
+        filter_metadata: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Busca exata (L2, como IndexFlatL2) sobre os vetores mapeados em memória
+        filter_metadata filtra por igualdade dos campos do metadado (como no Qdrant)
+        """
+        try:
+            view = self.views.get(collection_name)
+            if view is None:
+                view = await asyncio.to_thread(self._open, collection_name)
+            
+            if view is None or len(view[2]) == 0:
+                return {"documents": [[]], "metadatas": [[]], "distances": [[]]}
+            
+            _, vectors, metadata = view
+            query_array = np.array([query_embedding]).astype('float32')
+            
+            # knn varre todos os vetores: roda em thread para não travar o event loop
+            distances, positions = await asyncio.to_thread(
+                self._knn, vectors, metadata, query_array, n_results, filter_metadata
+            )
+            
+            documents = []
+            metadatas = []
+            
+            for idx in positions:
+                meta = dict(metadata[idx])
+                documents.append(meta.pop('document', ''))
+                metadatas.append(meta)
+            
+            return {
+                "documents": [documents],
+                "metadatas": [metadatas],
+                "distances": [distances]
+            }
+        except Exception as e:
+            print(f"❌ Erro ao buscar no FAISS compartilhado: {e}")
+            return {"documents": [[]], "metadatas": [[]], "distances": [[]]}
+    
+    @staticmethod
+    def _knn(
+        vectors: np.ndarray,
+        metadata: List[Dict],
+        query_array: np.ndarray,
+        n_results: int,
+        filter_metadata: Optional[Dict]
+    ) -> Tuple[List[float], List[int]]:
+        """Vizinhos mais próximos (opcionalmente só entre os que passam no filtro); roda em thread"""
+        import faiss
+        
+        candidates = None
+        if filter_metadata:
+            candidates = [
+                i for i, meta in enumerate(metadata)
+                if all(meta.get(k) == v for k, v in filter_metadata.items())
+            ]
+            if not candidates:
+                return [], []
+            vectors = vectors[candidates]
+        
+        k = min(n_results, len(vectors))
+        distances, indices = faiss.knn(query_array, vectors, k)
+        
+        # Índices relativos aos candidatos voltam para a posição na collection
+        kept = [(float(d), int(i)) for d, i in zip(distances[0], indices[0]) if 0 <= i < len(vectors)]
+        positions = [candidates[i] if candidates is not None else i for _, i in kept]
+        return [d for d, _ in kept], positions
+    
+    async def delete_collection(self, collection_name: str) -> bool:
+        """Deleta a collection e avisa os outros workers"""
+        try:
+            await asyncio.to_thread(self._remove, collection_name)
+            self.views.pop(collection_name, None)
+            await self.change_feed.publish(self.CHANGE_TOPIC, collection_name, deleted=True)
+            return True
+        except Exception as e:
+            print(f"❌ Erro ao deletar FAISS collection: {e}")
+            return False
+    
+    async def get_collection_count(self, collection_name: str) -> int:
+        """Retorna contagem (do ponteiro, sem abrir os vetores)"""
+        try:
+            current = await asyncio.to_thread(self._read_current, collection_name)
+            return current["count"] if current else 0
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Erro ao ler contagem da collection FAISS {collection_name}: {e}")
+            return 0
+
+
 class QdrantAdapter(BaseVectorStoreAdapter):
     """Adaptador para Qdrant (cloud/self-hosted)"""
     
@@ -429,6 +700,9 @@ class VectorStoreAdapterFactory:
         if settings.vector_store == "chromadb":
             return ChromaDBAdapter(settings)
         elif settings.vector_store == "faiss":
+            # Vários workers: índice compartilhado via mmap em vez de uma cópia por processo
+            if settings.faiss_shared_index or settings.api_workers > 1:
+                return SharedFAISSAdapter(settings)
             return FAISSAdapter(settings)
         elif settings.vector_store == "qdrant":
             return QdrantAdapter(settings)
@@ -1,7 +1,10 @@
 """Agents package"""
 from .chat_agent import chat_agent, ChatAgent
+from .prompt_builder import prompt_builder, PromptBuilder
 
 __all__ = [
     "chat_agent",
     "ChatAgent",
+    "prompt_builder",
+    "PromptBuilder",
 ]
@@ -5,127 +5,146 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
 
+import time
 from typing import List, Dict, Optional
-import agentops
-from openai import AsyncOpenAI
 from shared.config import settings
+from app.adapters.llm_adapter import get_llm_adapter
 from app.services.rag_service import rag_service
+from app.services.response_cache import response_cache
+from app.services.conversation_memory import conversation_memory
+from app.services.context_packer import context_packer
+from app.agents.prompt_builder import prompt_builder
+from app.metrics import observe_stage, record_stage
+from app.tracing import tracer
+from app.dependencies import LazyService
 
 
 class ChatAgent:
     """Agente de chat com integração AgentOps"""
     
     def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
+        # Roteamento entre deployments, coalescing e micro-batching ficam no adaptador
+        self.llm = get_llm_adapter(settings)
+        # Criados junto com o agente (fora do event loop, via Depends/aget): a primeira
+        # requisição não monta RAG e tokenizer dentro do loop
+        rag_service.get()
+        context_packer.get()
         print("✅ Chat Agent inicializado")
     
-    @agentops.record_action("chat_with_rag")
+    @tracer.record_action("chat_with_rag")
     async def chat_with_rag(
         self,
         bot_id: str,
         bot_instructions: str,
         user_message: str,
-        enable_rag: bool = True
+        enable_rag: bool = True,
+        session_id: Optional[str] = None
     ) -> Dict:
         """
         Chat com RAG habilitado
-        AgentOps rastreia automaticamente esta ação
+        Com session_id, inclui o histórico (resumo + turnos recentes) da conversa
+        AgentOps registra esta ação (com amostragem, exportada em background)
         """
         
+        with observe_stage("history_load"):
+            history = await conversation_memory.load(session_id) if session_id else []
+        
         # 1. Busca contexto relevante (se RAG habilitado)
         context_docs = []
         if enable_rag:
-            context_docs = await rag_service.search_relevant_documents(
-                bot_id=bot_id,
-                query=user_message
-            )
-        
-        # 2. Monta prompt com contexto
-        system_prompt = self._build_system_prompt(
-            bot_instructions,
-            context_docs
-        )
+            # Versão dos documentos antes da busca: um upload concluído durante a chamada
+            # ao LLM não pode ser associado à resposta gerada com o contexto antigo
+            doc_version = response_cache.doc_version(bot_id)
+            
+            with observe_stage("query_embed"):
+                query_embedding = await rag_service.embed_query(user_message)
+            
+            # Pergunta parecida já respondida (só sem histórico: a resposta depende da conversa)
+            if settings.semantic_cache_enabled and not history:
+                with observe_stage("cache_lookup"):
+                    cached = response_cache.get(bot_id, bot_instructions, query_embedding)
+                if cached is not None:
+                    # O turno entra na memória mesmo servido do cache (senão some do histórico)
+                    if session_id:
+                        await conversation_memory.append(session_id, bot_id, user_message, cached["response"])
+                    return {**cached, "cached": True}
+            
+            with observe_stage("vector_search"):
+                context_docs = await rag_service.search_relevant_documents(
+                    bot_id=bot_id,
+                    query=user_message,
+                    query_embedding=query_embedding
+                )
         
-        # 3. Chama OpenAI (AgentOps rastreia automaticamente)
-        response = await self.client.chat.completions.create(
-            model=settings.chat_model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            temperature=0.7,
-            max_tokens=1000
-        )
+        # 2. Monta mensagens: prefixo estático do bot, contexto e pergunta
+        with observe_stage("prompt_build"):
+            messages = prompt_builder.build_messages(
+                bot_id,
+                bot_instructions,
+                user_message,
+                context_docs,
+                history
+            )
         
-        # 4. Extrai resposta
-        assistant_message = response.choices[0].message.content
+        # 3. Chama o LLM (OpenAI ou Azure, via adaptador)
+        response = await self._complete(messages)
+        assistant_message = response["content"]
+        cached_tokens = prompt_builder.record_usage(response["usage"])
         
-        # 5. Prepara resultado
+        # 4. Prepara resultado
         result = {
             "response": assistant_message,
             "sources": [doc["source"] for doc in context_docs],
             "context_used": len(context_docs) > 0,
-            "model": settings.chat_model,
-            "tokens_used": response.usage.total_tokens if response.usage else 0
+            "model": response["model"],
+            "tokens_used": response["usage"]["total_tokens"],
+            "cached_tokens": cached_tokens
         }
         
-        return result
-    
-    def _build_system_prompt(
-        self,
-        bot_instructions: str,
-        context_docs: List[Dict]
-    ) -> str:
-        """Monta system prompt com contexto RAG"""
-        
-        prompt = f"{bot_instructions}\n\n"
+        if enable_rag and settings.semantic_cache_enabled and not history:
+            response_cache.set(bot_id, bot_instructions, user_message, query_embedding, result, doc_version)
         
-        if context_docs:
-            prompt += "## Contexto Relevante dos Documentos:\n\n"
-            
-            for i, doc in enumerate(context_docs, 1):
-                source = doc.get("source", "Unknown")
-                content = doc.get("content", "")
-                similarity = doc.get("similarity", 0)
-                
-                prompt += f"### Documento {i} (Similaridade: {similarity:.2%}):\n"
-                prompt += f"**Fonte:** {source}\n"
-                prompt += f"**Conteúdo:**\n{content}\n\n"
-            
-            prompt += "---\n\n"
-            prompt += "Use as informações acima para responder a pergunta do usuário. "
-            prompt += "Se a informação não estiver nos documentos, indique isso claramente.\n"
+        if session_id:
+            await conversation_memory.append(session_id, bot_id, user_message, assistant_message)
         
-        return prompt
+        return result
     
-    @agentops.record_action("simple_chat")
+    @tracer.record_action("simple_chat")
     async def simple_chat(
         self,
         bot_instructions: str,
-        user_message: str
+        user_message: str,
+        bot_id: str = "default"
     ) -> Dict:
         """Chat simples sem RAG"""
         
-        response = await self.client.chat.completions.create(
-            model=settings.chat_model,
-            messages=[
-                {"role": "system", "content": bot_instructions},
-                {"role": "user", "content": user_message}
-            ],
-            temperature=0.7,
-            max_tokens=1000
+        response = await self._complete(
+            prompt_builder.build_messages(bot_id, bot_instructions, user_message)
         )
-        
-        assistant_message = response.choices[0].message.content
+        cached_tokens = prompt_builder.record_usage(response["usage"])
         
         return {
-            "response": assistant_message,
+            "response": response["content"],
             "sources": [],
             "context_used": False,
-            "model": settings.chat_model,
-            "tokens_used": response.usage.total_tokens if response.usage else 0
+            "model": response["model"],
+            "tokens_used": response["usage"]["total_tokens"],
+            "cached_tokens": cached_tokens
         }
+    
+    async def _complete(self, messages: List[Dict]) -> Dict:
+        """
+        Chama o modelo de chat pelo adaptador e mede a latência total
+        Com LLM_STREAMING a resposta vem em streaming e o time-to-first-token também é medido
+        """
+        extra = {"stream": True} if settings.llm_streaming else {}
+        start = time.perf_counter()
+        response = await self.llm.chat_completion(messages, temperature=0.7, max_tokens=1000, **extra)
+        record_stage("llm_total", time.perf_counter() - start)
+        if response.get("first_token_at"):
+            record_stage("llm_first_token", response["first_token_at"] - start)
+        return response
 
 
-# Instância global
-chat_agent = ChatAgent()
+# Instância global (criada no primeiro uso)
+chat_agent = LazyService("chat_agent", ChatAgent)
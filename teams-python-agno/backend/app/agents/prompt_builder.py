@@ -0,0 +1,116 @@
+"""
+Prompt Builder - Layout de mensagens com prefixo estático por bot
+Mantém instruções e regras byte a byte idênticas entre chamadas para aproveitar
+o cache de prompt do provedor; contexto RAG e pergunta vêm depois do prefixo
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
+
+import hashlib
+from collections import OrderedDict
+from typing import List, Dict, Optional
+from app.services.context_packer import context_packer
+
+
+# Regras fixas: fazem parte do prefixo, mesmo quando não há contexto
+FORMATTING_RULES = (
+    "## Regras de Resposta:\n"
+    "Quando houver uma mensagem com contexto de documentos, use as informações dela "
+    "para responder a pergunta do usuário. "
+    "Se a informação não estiver nos documentos, indique isso claramente.\n"
+)
+
+
+class PromptBuilder:
+    """Monta as mensagens do chat com prefixo estável e memoizado por versão do bot"""
+    
+    def __init__(self, max_prefixes: int = 1024):
+        self.max_prefixes = max_prefixes
+        self._prefixes: OrderedDict = OrderedDict()
+        
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+    
+    @staticmethod
+    def bot_version(bot_instructions: str) -> str:
+        """Versão do bot derivada das instruções (muda quando elas mudam)"""
+        return hashlib.sha256(bot_instructions.encode("utf-8")).hexdigest()[:16]
+    
+    def static_prefix(self, bot_id: str, bot_instructions: str) -> str:
+        """Prefixo estático (instruções + regras), memoizado por bot e versão"""
+        key = (bot_id, self.bot_version(bot_instructions))
+        
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            prefix = f"{bot_instructions.strip()}\n\n{FORMATTING_RULES}"
+            self._prefixes[key] = prefix
+            while len(self._prefixes) > self.max_prefixes:
+                self._prefixes.popitem(last=False)
+        else:
+            self._prefixes.move_to_end(key)
+        
+        return prefix
+    
+    @staticmethod
+    def format_context(context_docs: List[Dict]) -> Optional[str]:
+        """Formata o contexto RAG dentro do orçamento de tokens"""
+        packed_docs = context_packer.pack(context_docs)
+        if not packed_docs:
+            return None
+        
+        parts = ["## Contexto Relevante dos Documentos:\n"]
+        for i, doc in enumerate(packed_docs, 1):
+            parts.append(
+                f"### Documento {i} (Similaridade: {doc['similarity']:.2%}):\n"
+                f"**Fonte:** {doc['source']}\n"
+                f"**Conteúdo:**\n{doc['content']}\n"
+            )
+        
+        return "\n".join(parts)
+    
+    def build_messages(
+        self,
+        bot_id: str,
+        bot_instructions: str,
+        user_message: str,
+        context_docs: Optional[List[Dict]] = None,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> List[Dict[str, str]]:
+        """Prefixo estático -> histórico da sessão -> contexto variável -> mensagem do usuário"""
+        messages = [{"role": "system", "content": self.static_prefix(bot_id, bot_instructions)}]
+        
+        # Histórico muda pouco entre turnos: antes do contexto para estender o prefixo cacheável
+        if history:
+            messages.extend(history)
+        
+        context = self.format_context(context_docs) if context_docs else None
+        if context:
+            messages.append({"role": "system", "content": context})
+        
+        messages.append({"role": "user", "content": user_message})
+        return messages
+    
+    def record_usage(self, usage: Optional[Dict]) -> int:
+        """Registra tokens de prompt e quantos vieram do cache do provedor (usage do adaptador LLM)"""
+        if not usage or usage.get("estimated"):
+            # Sem usage do provedor (streaming): não há como saber quanto veio do cache
+            return 0
+        
+        cached = usage.get("cached_tokens", 0)
+        self.prompt_tokens += usage.get("prompt_tokens", 0)
+        self.cached_tokens += cached
+        return cached
+    
+    def stats(self) -> Dict:
+        """Taxa de tokens de prompt servidos pelo cache do provedor"""
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cached_ratio": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+            "memoized_prefixes": len(self._prefixes)
+        }
+
+
+# Instância global
+prompt_builder = PromptBuilder()
@@ -3,10 +3,11 @@ Database connection and configuration
 Supports SQLite (default), PostgreSQL, and MongoDB
 Easy migration path: SQLite -> PostgreSQL -> MongoDB
 """
-from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.pool import StaticPool
+from typing import Tuple
 import os
 from pathlib import Path
 
@@ -14,30 +15,92 @@ from pathlib import Path
 DATABASE_TYPE = os.getenv("DATABASE_TYPE", "sqlite")  # sqlite, postgresql, mongodb
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./data/teams_bots.db")
 
+# SQLite profile: "tuned" (WAL + pool de leitura + escritor único) ou "legacy" (StaticPool)
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "tuned")
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",  # Seguro com WAL; fsync só no checkpoint
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT", "5000"),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-65536"),  # Negativo = KiB (64 MiB)
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", "268435456"),  # 256 MiB
+    "temp_store": "MEMORY",
+}
+
 # SQLAlchemy Base
 Base = declarative_base()
 
 # Global database session
 async_session_maker: async_sessionmaker = None
+async_read_session_maker: async_sessionmaker = None
 engine = None
+read_engine = None
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Aplica os pragmas do perfil em cada nova conexão SQLite"""
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+def _set_query_only(dbapi_connection, connection_record):
+    """Conexões do pool de leitura não podem escrever"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def build_sqlite_engines(url: str, profile: str = SQLITE_PROFILE) -> Tuple[AsyncEngine, AsyncEngine]:
+    """
+    Cria engines (escrita, leitura) para SQLite
+    tuned: WAL permite leitores em paralelo com um único escritor serializado
+    legacy: uma conexão compartilhada (StaticPool) para tudo
+    """
+    if profile == "legacy" or ":memory:" in url:
+        engine = create_async_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+            echo=False
+        )
+        return engine, engine
+    
+    # Escritor único: pool de 1 conexão serializa as transações de escrita
+    write_engine = create_async_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        pool_size=1,
+        max_overflow=0,
+        echo=False
+    )
+    read_engine = create_async_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        pool_size=SQLITE_READ_POOL_SIZE,
+        max_overflow=0,
+        echo=False
+    )
+    
+    event.listen(write_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    event.listen(read_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    event.listen(read_engine.sync_engine, "connect", _set_query_only)
+    
+    return write_engine, read_engine
 
 
 async def connect_db():
     """Initialize database connection"""
-    global engine, async_session_maker
+    global engine, read_engine, async_session_maker, async_read_session_maker
     
     if DATABASE_TYPE == "sqlite":
         # Criar diretório data se não existir
         Path("./data").mkdir(exist_ok=True)
         
         # SQLite configuration (async)
-        engine = create_async_engine(
-            DATABASE_URL,
-            connect_args={"check_same_thread": False},
-            poolclass=StaticPool,
-            echo=False  # Set to True for debugging
-        )
-        print(f"✅ Using SQLite database: {DATABASE_URL}")
+        engine, read_engine = build_sqlite_engines(DATABASE_URL)
+        print(f"✅ Using SQLite database: {DATABASE_URL} (profile: {SQLITE_PROFILE})")
         
     elif DATABASE_TYPE == "postgresql":
         # PostgreSQL configuration (async)
@@ -47,6 +110,7 @@ async def connect_db():
             pool_size=20,
             max_overflow=0
         )
+        read_engine = engine
         print(f"✅ Using PostgreSQL database")
         
     elif DATABASE_TYPE == "mongodb":
@@ -55,12 +119,16 @@ async def connect_db():
         client = AsyncIOMotorClient(DATABASE_URL)
         engine = client.get_database("teams_bots")
         print(f"✅ Using MongoDB database")
+        await ensure_mongo_indexes(engine)
         return
     
     # Create session maker (SQLite/PostgreSQL)
     async_session_maker = async_sessionmaker(
         engine, class_=AsyncSession, expire_on_commit=False
     )
+    async_read_session_maker = async_sessionmaker(
+        read_engine, class_=AsyncSession, expire_on_commit=False
+    )
     
     # Create tables (SQLite/PostgreSQL only)
     async with engine.begin() as conn:
@@ -68,12 +136,24 @@ async def connect_db():
         print("✅ Database tables created")
 
 
+async def ensure_mongo_indexes(db):
+    """Cria índices das consultas quentes (MongoDB)"""
+    # Histórico: filtro por bot/sessão + paginação por cursor (timestamp, _id)
+    await db.chat_history.create_index([("bot_id", 1), ("session_id", 1), ("timestamp", -1), ("_id", -1)])
+    await db.chat_history.create_index([("bot_id", 1), ("timestamp", -1), ("_id", -1)])
+    await db.chat_history.create_index([("session_id", 1), ("timestamp", -1), ("_id", -1)])
+    await db.chat_history.create_index([("timestamp", -1), ("_id", -1)])
+    await db.documents.create_index([("bot_id", 1)])
+    await db.documents.create_index([("batch_id", 1), ("status", 1)], sparse=True)
+    print("✅ MongoDB indexes created")
+
+
 async def close_db():
     """Close database connection"""
-    global engine
-    
     if engine and DATABASE_TYPE in ["sqlite", "postgresql"]:
         await engine.dispose()
+        if read_engine is not None and read_engine is not engine:
+            await read_engine.dispose()
         print("✅ Database connection closed")
     elif DATABASE_TYPE == "mongodb" and engine:
         engine.client.close()
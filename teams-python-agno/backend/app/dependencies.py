@@ -0,0 +1,124 @@
+"""
+Dependências - Serviços pesados criados sob demanda
+Chroma, LangChain e OpenAI só são importados/inicializados no primeiro uso (ou no warm-up),
+o que mantém o import da API e o restart de workers rápidos
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+# Modos de warm-up (SERVICE_WARM_UP)
+WARM_UP_STARTUP = "startup"        # Inicializa antes de aceitar requisições
+WARM_UP_BACKGROUND = "background"  # Inicializa em background após o startup
+WARM_UP_NONE = "none"              # Só no primeiro uso
+
+# Serviços registrados, na ordem de criação dos proxies
+_registry: Dict[str, "LazyService"] = {}
+
+
+class LazyService(Generic[T]):
+    """
+    Proxy para um serviço criado no primeiro acesso
+    - atributos são repassados à instância (vector_service.search_similar(...) continua funcionando)
+    - chamável: serve como dependência FastAPI, Depends(rag_service), criada fora do event loop
+    - em código assíncrono, prefira await aget(): get() bloqueia enquanto o serviço é criado
+    - override() troca a implementação (testes de carga, mocks)
+    """
+    
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self._name = name
+        self._factory = factory
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+        self._init_seconds: Optional[float] = None
+        # Criação em andamento pelo event loop (warm-up ou primeira requisição)
+        self._pending: Optional[asyncio.Future] = None
+        _registry[name] = self
+    
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+    
+    def get(self) -> T:
+        """Instância do serviço, criando-a se necessário"""
+        instance = self._instance
+        if instance is None:
+            # Lock: warm-up em background e primeira requisição não criam duas instâncias
+            with self._lock:
+                if self._instance is None:
+                    started = time.perf_counter()
+                    self._instance = self._factory()
+                    self._init_seconds = time.perf_counter() - started
+                instance = self._instance
+        return instance
+    
+    async def aget(self) -> T:
+        """Instância do serviço sem bloquear o event loop: a criação roda em uma thread e
+        chamadas concorrentes (inclusive o warm-up em background) esperam a mesma criação"""
+        if self._instance is not None:
+            return self._instance
+        
+        if self._pending is None:
+            self._pending = asyncio.ensure_future(asyncio.to_thread(self.get))
+            self._pending.add_done_callback(self._clear_pending)
+        # shield: cancelar uma requisição não cancela a criação compartilhada
+        return await asyncio.shield(self._pending)
+    
+    def _clear_pending(self, future: asyncio.Future):
+        # Falha na criação: a próxima chamada tenta de novo
+        self._pending = None
+    
+    async def __call__(self) -> T:
+        return await self.aget()
+    
+    def __getattr__(self, attr: str):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self.get(), attr)
+    
+    def override(self, instance: T):
+        """Substitui a instância (ex.: implementação falsa em testes de carga)"""
+        with self._lock:
+            self._instance = instance
+            self._init_seconds = 0.0
+    
+    def reset(self):
+        """Descarta a instância; a próxima chamada cria outra"""
+        with self._lock:
+            self._instance = None
+            self._init_seconds = None
+    
+    def stats(self) -> Dict:
+        return {
+            "initialized": self.initialized,
+            "init_ms": round(self._init_seconds * 1000, 1) if self._init_seconds is not None else None
+        }
+
+
+async def warm_up_services(names: Optional[List[str]] = None):
+    """Cria os serviços em uma thread, sem bloquear o event loop"""
+    started = time.perf_counter()
+    
+    for name, service in list(_registry.items()):
+        if names is not None and name not in names:
+            continue
+        try:
+            await service.aget()
+        except Exception as e:
+            # Falha no warm-up não derruba a API: o serviço tenta de novo no primeiro uso
+            print(f"⚠️ Warm-up de {name} falhou: {e}")
+    
+    print(f"🔥 Serviços aquecidos em {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+def services_stats() -> Dict[str, Dict]:
+    """Estado de inicialização de cada serviço"""
+    return {name: service.stats() for name, service in _registry.items()}
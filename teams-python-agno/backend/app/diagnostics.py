@@ -0,0 +1,215 @@
+"""
+Diagnóstico - Detector de chamadas bloqueantes no event loop
+Uma thread vigia o heartbeat do loop; quando ele atrasa além do limite, captura a pilha
+da thread do loop e agrega por ponto de chamada no código da aplicação
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import asyncio
+import hmac
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from shared.config import settings
+
+
+# Raiz do backend: frames abaixo dela são código da aplicação
+APP_ROOT = str(Path(__file__).resolve().parent.parent)
+
+# Frames mais internos guardados em cada amostra
+STACK_DEPTH = 30
+
+_THIS_FILE = str(Path(__file__).resolve())
+
+
+def admin_token_valid(token: Optional[str]) -> bool:
+    """Confere o token das rotas de administração (sem ADMIN_TOKEN configurado, nenhum token vale)"""
+    if not settings.admin_token:
+        return False
+    return token is not None and hmac.compare_digest(token, settings.admin_token)
+
+
+def _format_frame(frame: traceback.FrameSummary) -> str:
+    filename = frame.filename
+    if filename.startswith(APP_ROOT):
+        filename = filename[len(APP_ROOT) + 1:]
+    return f"{filename}:{frame.lineno} in {frame.name}"
+
+
+def _call_site(stack: traceback.StackSummary) -> Optional[traceback.FrameSummary]:
+    """Frame mais interno do código da aplicação (quem chamou o código bloqueante)"""
+    for frame in reversed(stack):
+        if frame.filename.startswith(APP_ROOT) and frame.filename != _THIS_FILE:
+            return frame
+    return None
+
+
+class BlockingDetector:
+    """Mede o atraso do event loop e registra onde ele ficou bloqueado"""
+    
+    def __init__(self, threshold_ms: Optional[float] = None, max_sites: Optional[int] = None):
+        self.threshold = (threshold_ms or settings.blocking_threshold_ms) / 1000
+        self.heartbeat_interval = self.threshold / 4
+        self.max_sites = max_sites or settings.blocking_max_sites
+        
+        self._lock = threading.Lock()
+        self._sites: Dict[Tuple[str, str], Dict] = {}
+        self._beat = 0.0
+        self._beat_id = 0
+        # Amostra do bloqueio em andamento: (beat_id, chave do ponto de chamada)
+        self._pending: Optional[Tuple[int, Tuple[str, str]]] = None
+        
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.blocked_events = 0
+        self.dropped_sites = 0
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    async def start(self):
+        """Inicia heartbeat e thread de vigia (só com BLOCKING_DETECTOR_ENABLED)"""
+        if not settings.blocking_detector_enabled or self.running:
+            return
+        
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="blocking-detector", daemon=True)
+        self._thread.start()
+        print(f"🔍 Detector de bloqueio ativo (limite {self.threshold * 1000:.0f} ms)")
+    
+    async def stop(self):
+        """Encerra heartbeat e thread de vigia"""
+        if self._task is None:
+            return
+        
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        
+        self._stop.set()
+        await asyncio.to_thread(self._thread.join, 1.0)
+        self._thread = None
+    
+    async def _heartbeat(self):
+        """Roda no loop: mede o atraso de cada sleep e fecha o bloqueio amostrado"""
+        while True:
+            expected = time.monotonic() + self.heartbeat_interval
+            await asyncio.sleep(self.heartbeat_interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            
+            with self._lock:
+                self.last_lag = lag
+                self.max_lag = max(self.max_lag, lag)
+                
+                if lag >= self.threshold:
+                    self.blocked_events += 1
+                    # Duração real do bloqueio atribuída ao ponto amostrado pela vigia
+                    if self._pending is not None and self._pending[0] == self._beat_id:
+                        site = self._sites.get(self._pending[1])
+                        if site is not None:
+                            site["total_ms"] += lag * 1000
+                            site["max_ms"] = max(site["max_ms"], lag * 1000)
+                
+                self._pending = None
+                self._beat = now
+                self._beat_id += 1
+    
+    def _watch(self):
+        """Roda em thread: amostra a pilha do loop uma vez por bloqueio"""
+        while not self._stop.wait(self.heartbeat_interval):
+            with self._lock:
+                beat, beat_id, pending = self._beat, self._beat_id, self._pending
+            
+            stalled = time.monotonic() - beat - self.heartbeat_interval
+            if stalled < self.threshold or (pending is not None and pending[0] == beat_id):
+                continue
+            
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame, limit=STACK_DEPTH)
+            del frame
+            
+            self._record(beat_id, stack)
+    
+    def _record(self, beat_id: int, stack: traceback.StackSummary):
+        leaf = stack[-1]
+        call_site = _call_site(stack)
+        key = (
+            _format_frame(call_site) if call_site else "desconhecido",
+            _format_frame(leaf)
+        )
+        
+        with self._lock:
+            # O loop já voltou: bloqueio terminou entre a leitura e a amostra
+            if beat_id != self._beat_id:
+                return
+            
+            site = self._sites.get(key)
+            if site is None:
+                if len(self._sites) >= self.max_sites:
+                    self.dropped_sites += 1
+                    return
+                site = self._sites[key] = {
+                    "call_site": key[0],
+                    "blocking_frame": key[1],
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "last_seen": None,
+                    "stack": []
+                }
+            
+            site["count"] += 1
+            site["last_seen"] = datetime.utcnow()
+            site["stack"] = [_format_frame(frame) for frame in stack]
+            self._pending = (beat_id, key)
+    
+    def report(self) -> Dict:
+        """Pontos de bloqueio ordenados pelo tempo total bloqueado"""
+        with self._lock:
+            sites: List[Dict] = sorted(
+                (dict(site) for site in self._sites.values()),
+                key=lambda site: site["total_ms"],
+                reverse=True
+            )
+            return {
+                "enabled": settings.blocking_detector_enabled,
+                "running": self.running,
+                "threshold_ms": self.threshold * 1000,
+                "last_lag_ms": self.last_lag * 1000,
+                "max_lag_ms": self.max_lag * 1000,
+                "blocked_events": self.blocked_events,
+                "dropped_sites": self.dropped_sites,
+                "sites": sites
+            }
+    
+    def reset(self):
+        """Limpa os pontos registrados e as estatísticas de atraso"""
+        with self._lock:
+            self._sites.clear()
+            self._pending = None
+            self.max_lag = 0.0
+            self.blocked_events = 0
+            self.dropped_sites = 0
+
+
+# Instância global
+blocking_detector = BlockingDetector()
@@ -7,20 +7,32 @@ from pathlib import Path
 # Adiciona pasta raiz ao path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
 
-from fastapi import FastAPI
+import asyncio
+from typing import Optional
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-import agentops
 from shared.config import settings
-from app.routers import bots, documents, chat
+from app.routers import bots, documents, chat, search, admin
 from app.database import connect_db, close_db
-
-
-# Inicializa AgentOps
-agentops.init(
-    api_key=settings.agentops_api_key,
-    default_tags=["teams-bot", "production"]
+from app.adapters.http_client import warm_up_connections, close_http_client
+from app.adapters.change_feed import change_feed
+from app.adapters.llm_adapter import coalescing_counts
+from app.services import history_writer, response_cache, bot_cache
+from app.tracing import tracer
+from app.dependencies import warm_up_services, services_stats, WARM_UP_STARTUP, WARM_UP_BACKGROUND
+from app.diagnostics import blocking_detector
+from app.profiling import ProfilingMiddleware
+from app.agents import prompt_builder
+from app.metrics import (
+    MetricsMiddleware,
+    HISTORY_BUFFER,
+    CONTENT_TYPE_LATEST,
+    cache_stats_collector,
+    event_loop_monitor,
+    render_metrics
 )
 
+
 # Cria aplicação FastAPI
 app = FastAPI(
     title="Teams Bot Automation API",
@@ -39,22 +51,76 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latência por requisição (Prometheus)
+app.add_middleware(MetricsMiddleware)
+
+# Profile de requisições individuais (header X-Profile + X-Admin-Token): só com token configurado
+if settings.profiling_enabled and settings.admin_token:
+    app.add_middleware(ProfilingMiddleware)
+
+# Caches e filas lidos no momento do scrape
+cache_stats_collector.register("response", lambda: (response_cache.hits, response_cache.misses))
+cache_stats_collector.register("bot_config", lambda: (bot_cache.hits, bot_cache.misses))
+cache_stats_collector.register(
+    "prompt_prefix_tokens",
+    lambda: (prompt_builder.cached_tokens, prompt_builder.prompt_tokens - prompt_builder.cached_tokens)
+)
+# Single-flight do LLM: "hit" = chamada idêntica reaproveitada, "miss" = chamada ao provedor
+cache_stats_collector.register("llm_single_flight", coalescing_counts)
+HISTORY_BUFFER.set_function(lambda: history_writer.pending)
+
+
+# Warm-up em background (SERVICE_WARM_UP=background)
+_warm_up_task: Optional[asyncio.Task] = None
+
+
+async def _warm_up():
+    """Conexões, AgentOps e serviços pesados (Chroma, LangChain, OpenAI)"""
+    await warm_up_connections(settings)
+    # AgentOps inicializado fora do import e exportando em background
+    await tracer.start()
+    await warm_up_services()
+
 
 # Events
 @app.on_event("startup")
 async def startup_event():
     """Executa na inicialização"""
+    global _warm_up_task
+    
     await connect_db()
+    await history_writer.start()
+    # Invalidações publicadas pelos outros workers (caches, índices FAISS)
+    await change_feed.start()
+    await event_loop_monitor.start()
+    # Diagnóstico de chamadas bloqueantes (BLOCKING_DETECTOR_ENABLED)
+    await blocking_detector.start()
+    
+    # Serviços pesados: no startup, em background ou só no primeiro uso
+    if settings.service_warm_up == WARM_UP_STARTUP:
+        await _warm_up()
+    elif settings.service_warm_up == WARM_UP_BACKGROUND:
+        _warm_up_task = asyncio.create_task(_warm_up())
+    else:
+        # Sem warm-up: só o AgentOps, também fora do caminho do startup
+        _warm_up_task = asyncio.create_task(tracer.start())
+    
     print("🚀 API iniciada com sucesso!")
-    print(f"📊 AgentOps ativo: {agentops.is_initialized()}")
     print(f"📝 Docs: http://{settings.api_host}:{settings.api_port}/docs")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Executa no desligamento"""
+    if _warm_up_task is not None and not _warm_up_task.done():
+        _warm_up_task.cancel()
+    await event_loop_monitor.stop()
+    await blocking_detector.stop()
+    await change_feed.stop()
+    await history_writer.stop()
     await close_db()
-    agentops.end_all_sessions()
+    await close_http_client()
+    await tracer.stop()
     print("👋 API encerrada")
 
 
@@ -64,15 +130,26 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "agentops": agentops.is_initialized(),
+        "agentops": tracer.active,
+        "services": services_stats(),
+        "change_feed": change_feed.stats(),
         "version": "1.0.0"
     }
 
 
+# Métricas Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métricas no formato texto do Prometheus"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 # Rotas
 app.include_router(bots.router, prefix="/api/bots", tags=["Bots"])
 app.include_router(documents.router, prefix="/api/documents", tags=["Documents"])
 app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
+app.include_router(search.router, prefix="/api/search", tags=["Search"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 
 
 # Root
@@ -89,9 +166,18 @@ async def root():
 if __name__ == "__main__":
     import uvicorn
     
+    # Reload e múltiplos workers são mutuamente exclusivos no uvicorn
+    workers = max(settings.api_workers, 1)
+    if workers > 1 and settings.vector_store == "chromadb":
+        # PersistentClient do ChromaDB não é seguro com vários processos no mesmo diretório
+        sys.exit("❌ API_WORKERS > 1 exige VECTOR_STORE=faiss ou qdrant (ChromaDB só com um worker)")
+    if workers > 1 and settings.api_reload:
+        print("⚠️ API_RELOAD ignorado com API_WORKERS > 1")
+    
     uvicorn.run(
         "app.main:app",
         host=settings.api_host,
         port=settings.api_port,
-        reload=settings.api_reload
+        reload=settings.api_reload and workers == 1,
+        workers=workers
     )
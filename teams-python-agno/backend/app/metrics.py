@@ -0,0 +1,220 @@
+"""
+Métricas no formato Prometheus (exportadas em /metrics)
+Latência por etapa do chat, ingestão, caches, fila do histórico e atraso do event loop
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from shared.config import settings
+
+
+# Buckets em segundos: de ~1 ms (cache, busca local) a dezenas de segundos (LLM)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Ingestão de documentos grandes pode levar minutos
+INGESTION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Atraso do event loop: qualquer valor acima de alguns ms indica código bloqueante
+LOOP_LAG_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+# Chat: bot_lookup, history_load, query_embed, cache_lookup, vector_search, prompt_build, llm_first_token, llm_total
+CHAT_STAGE_SECONDS = Histogram(
+    "chat_stage_seconds",
+    "Latência de cada etapa do caminho de chat",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Latência das requisições HTTP por handler",
+    ["method", "handler", "status"],
+    buckets=LATENCY_BUCKETS
+)
+
+# Ingestão
+INGESTION_DOCUMENTS = Counter("ingestion_documents", "Documentos processados", ["status"])
+INGESTION_BYTES = Counter("ingestion_bytes", "Bytes de documentos processados")
+INGESTION_CHUNKS = Counter("ingestion_chunks", "Chunks indexados")
+INGESTION_TOKENS = Counter("ingestion_tokens", "Tokens enviados ao modelo de embedding")
+INGESTION_STAGE_SECONDS = Histogram(
+    "ingestion_stage_seconds",
+    "Duração de cada etapa da ingestão",
+    ["stage"],
+    buckets=INGESTION_BUCKETS
+)
+INGESTION_QUEUED = Gauge("ingestion_queued", "Documentos aguardando vaga de processamento")
+INGESTION_IN_PROGRESS = Gauge("ingestion_in_progress", "Documentos em processamento")
+
+# Fila do gravador de histórico (valor lido no momento do scrape)
+HISTORY_BUFFER = Gauge("history_buffer_pending", "Registros de histórico aguardando gravação")
+HISTORY_WRITE_ERRORS = Counter("history_write_errors", "Falhas ao gravar um lote do histórico", ["sink"])
+HISTORY_RECORDS = Counter("history_records", "Registros de histórico por destino e resultado", ["sink", "outcome"])
+
+# Tracing (AgentOps): custo no caminho da requisição e destino de cada span
+TRACING_OVERHEAD_SECONDS = Histogram(
+    "tracing_overhead_seconds",
+    "Tempo gasto pelo tracing dentro da requisição (amostragem + enfileiramento)",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+)
+TRACING_SPANS = Counter("tracing_spans", "Spans por destino", ["outcome"])
+TRACING_QUEUE = Gauge("tracing_queue_pending", "Spans aguardando exportação")
+
+# Event loop
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds",
+    "Atraso do event loop em relação ao agendado",
+    buckets=LOOP_LAG_BUCKETS
+)
+EVENT_LOOP_LAG_LAST = Gauge("event_loop_lag_last_seconds", "Último atraso medido do event loop")
+
+
+@contextmanager
+def observe_stage(stage: str) -> Iterator[None]:
+    """Mede a duração de uma etapa do chat (também quando a etapa falha)"""
+    if not settings.metrics_enabled:
+        yield
+        return
+    
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        CHAT_STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+
+def record_stage(stage: str, seconds: float):
+    """Registra a duração de uma etapa medida fora de um bloco with"""
+    if settings.metrics_enabled:
+        CHAT_STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+def record_ingestion(stats: Optional[Dict]):
+    """Contabiliza um documento processado (stats de rag_service.process_document; None = falha)"""
+    if not settings.metrics_enabled:
+        return
+    
+    if stats is None:
+        INGESTION_DOCUMENTS.labels("failed").inc()
+        return
+    
+    INGESTION_DOCUMENTS.labels("completed").inc()
+    INGESTION_BYTES.inc(stats["bytes"])
+    INGESTION_CHUNKS.inc(stats["chunks"])
+    INGESTION_TOKENS.inc(stats["tokens"])
+    for stage, elapsed_ms in stats["timings_ms"].items():
+        INGESTION_STAGE_SECONDS.labels(stage).observe(elapsed_ms / 1000)
+
+
+class CacheStatsCollector:
+    """
+    Exporta hits/misses dos caches lendo stats() no momento do scrape
+    Nenhum custo extra no caminho quente: os caches já mantêm os contadores
+    """
+    
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], Tuple[float, float]]] = {}
+    
+    def register(self, name: str, read: Callable[[], Tuple[float, float]]):
+        """Registra um cache; read() retorna (hits, misses) acumulados"""
+        self._sources[name] = read
+    
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Acertos de cache", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Faltas de cache", labels=["cache"])
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Taxa de acerto acumulada", labels=["cache"])
+        
+        for name, read in self._sources.items():
+            cache_hits, cache_misses = read()
+            total = cache_hits + cache_misses
+            hits.add_metric([name], cache_hits)
+            misses.add_metric([name], cache_misses)
+            ratio.add_metric([name], cache_hits / total if total else 0.0)
+        
+        yield hits
+        yield misses
+        yield ratio
+
+
+class EventLoopLagMonitor:
+    """Mede quanto o event loop atrasa para acordar um sleep periódico"""
+    
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval or settings.event_loop_lag_interval
+        self._task: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """Inicia a medição em background"""
+        if settings.metrics_enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Encerra a medição"""
+        if self._task is None:
+            return
+        
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - scheduled)
+            EVENT_LOOP_LAG_SECONDS.observe(lag)
+            EVENT_LOOP_LAG_LAST.set(lag)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mede a latência de cada requisição HTTP"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.metrics_enabled:
+            await self.app(scope, receive, send)
+            return
+        
+        start = time.perf_counter()
+        status_code = 500
+        
+        async def _send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            # Nome do handler (e não o path) para manter a cardinalidade baixa
+            endpoint = scope.get("endpoint")
+            handler = endpoint.__name__ if endpoint else "unmatched"
+            HTTP_REQUEST_SECONDS.labels(scope["method"], handler, str(status_code)).observe(
+                time.perf_counter() - start
+            )
+
+
+def render_metrics() -> bytes:
+    """Serializa todas as métricas no formato texto do Prometheus"""
+    return generate_latest(REGISTRY)
+
+
+# Instâncias globais
+cache_stats_collector = CacheStatsCollector()
+REGISTRY.register(cache_stats_collector)
+event_loop_monitor = EventLoopLagMonitor()
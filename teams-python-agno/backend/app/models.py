@@ -2,12 +2,12 @@
 Database models with SQLAlchemy (SQLite/PostgreSQL)
 Also includes MongoDB models for future migration
 """
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, ForeignKey, JSON, Index, select, func
 from sqlalchemy.orm import relationship
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
-from database import Base
+from app.database import Base
 import uuid
 
 
@@ -39,11 +39,13 @@ class Bot(Base):
     is_active = Column(Boolean, default=True)
     
     # Relationships
-    documents = relationship("Document", back_populates="bot", cascade="all, delete-orphan")
-    conversations = relationship("Conversation", back_populates="bot", cascade="all, delete-orphan")
+    # lazy="raise": nada é carregado junto com o bot; quem precisar das coleções usa
+    # selectinload(Bot.documents) na consulta, e a listagem usa select_bots_with_counts()
+    documents = relationship("Document", back_populates="bot", cascade="all, delete-orphan", lazy="raise")
+    conversations = relationship("Conversation", back_populates="bot", cascade="all, delete-orphan", lazy="raise")
     
     def to_dict(self):
-        """Convert to dictionary"""
+        """Convert to dictionary (datetimes serializados pelo orjson na resposta)"""
         return {
             "id": self.id,
             "name": self.name,
@@ -51,8 +53,8 @@ class Bot(Base):
             "instructions": self.instructions,
             "enable_rag": self.enable_rag,
             "created_by": self.created_by,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
             "is_active": self.is_active
         }
 
@@ -72,15 +74,23 @@ class Document(Base):
     # Processing
     status = Column(String(20), default="pending")  # pending, processing, completed, failed
     chunk_count = Column(Integer, default=0)
+    # Telemetria da ingestão: etapa atual, bytes, páginas, chunks, tokens e tempo por etapa (ms)
+    ingestion_stats = Column(JSON, nullable=True)
     
     # Metadata
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    bot = relationship("Bot", back_populates="documents")
+    # lazy="raise": o bot não é carregado implicitamente (lazy load sob AsyncSession falha)
+    bot = relationship("Bot", back_populates="documents", lazy="raise")
+    
+    # Índices: listagem e agregação por bot
+    __table_args__ = (
+        Index("ix_documents_bot_id", "bot_id"),
+    )
     
     def to_dict(self):
-        """Convert to dictionary"""
+        """Convert to dictionary (datetimes serializados pelo orjson na resposta)"""
         return {
             "id": self.id,
             "bot_id": self.bot_id,
@@ -89,7 +99,8 @@ class Document(Base):
             "file_size": self.file_size,
             "status": self.status,
             "chunk_count": self.chunk_count,
-            "created_at": self.created_at.isoformat() if self.created_at else None
+            "ingestion": self.ingestion_stats,
+            "created_at": self.created_at
         }
 
 
@@ -105,21 +116,32 @@ class Conversation(Base):
     started_at = Column(DateTime, default=datetime.utcnow)
     last_message_at = Column(DateTime, default=datetime.utcnow)
     
+    # Memória: resumo incremental dos turnos antigos
+    summary = Column(Text, nullable=True)
+    summarized_count = Column(Integer, default=0)  # mensagens já incorporadas ao resumo
+    
     # Status
     is_active = Column(Boolean, default=True)
     
     # Relationships
-    bot = relationship("Bot", back_populates="conversations")
-    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
+    bot = relationship("Bot", back_populates="conversations", lazy="raise")
+    # Mensagens são paginadas por cursor; nunca carregadas junto com a conversa
+    messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan", lazy="raise")
+    
+    # Índices: conversas de um bot ordenadas pela última mensagem
+    __table_args__ = (
+        Index("ix_conversations_bot_last_message", "bot_id", "last_message_at"),
+    )
     
     def to_dict(self):
-        """Convert to dictionary"""
+        """Convert to dictionary (datetimes serializados pelo orjson na resposta)"""
         return {
             "id": self.id,
             "bot_id": self.bot_id,
             "user_id": self.user_id,
-            "started_at": self.started_at.isoformat() if self.started_at else None,
-            "last_message_at": self.last_message_at.isoformat() if self.last_message_at else None,
+            "started_at": self.started_at,
+            "last_message_at": self.last_message_at,
+            "summary": self.summary,
             "is_active": self.is_active
         }
 
@@ -139,19 +161,50 @@ class Message(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    conversation = relationship("Conversation", back_populates="messages")
+    conversation = relationship("Conversation", back_populates="messages", lazy="raise")
+    
+    # Índices: paginação por cursor (created_at, id) dentro da conversa
+    __table_args__ = (
+        Index("ix_messages_conversation_created", "conversation_id", "created_at", "id"),
+    )
     
     def to_dict(self):
-        """Convert to dictionary"""
+        """Convert to dictionary (datetimes serializados pelo orjson na resposta)"""
         return {
             "id": self.id,
             "conversation_id": self.conversation_id,
             "role": self.role,
             "content": self.content,
-            "created_at": self.created_at.isoformat() if self.created_at else None
+            "created_at": self.created_at
         }
 
 
+def select_bots_with_counts():
+    """
+    Bots com contagem de documentos e chunks em uma única consulta agrupada
+    Evita N+1 ao listar bots (uma consulta por bot para carregar documents)
+    """
+    document_stats = (
+        select(
+            Document.bot_id.label("bot_id"),
+            func.count(Document.id).label("document_count"),
+            func.coalesce(func.sum(Document.chunk_count), 0).label("chunk_count")
+        )
+        .group_by(Document.bot_id)
+        .subquery()
+    )
+    
+    return (
+        select(
+            Bot,
+            func.coalesce(document_stats.c.document_count, 0).label("document_count"),
+            func.coalesce(document_stats.c.chunk_count, 0).label("chunk_count")
+        )
+        .outerjoin(document_stats, document_stats.c.bot_id == Bot.id)
+        .order_by(Bot.created_at)
+    )
+
+
 # ==================== Pydantic Schemas (API) ====================
 
 class BotCreate(BaseModel):
@@ -171,6 +224,8 @@ class BotResponse(BaseModel):
     enable_rag: bool
     created_at: datetime
     updated_at: datetime
+    document_count: int = 0
+    chunk_count: int = 0
 
 
 class DocumentResponse(BaseModel):
@@ -182,9 +237,48 @@ class DocumentResponse(BaseModel):
     file_size: int
     status: str
     chunk_count: int
+    ingestion: Optional[Dict[str, Any]] = None
     created_at: datetime
 
 
+class IngestionStageStats(BaseModel):
+    """Tempo médio e participação de uma etapa da ingestão"""
+    avg_ms: float
+    max_ms: float
+    share: float
+
+
+class IngestionStatsResponse(BaseModel):
+    """Agregado da telemetria de ingestão dos documentos concluídos"""
+    bot_id: Optional[str] = None
+    documents: int
+    total_bytes: int
+    total_pages: int
+    total_chunks: int
+    total_tokens: int
+    stages: Dict[str, IngestionStageStats]
+    dominant_stage: Optional[str] = None
+
+
+class BulkUploadResponse(BaseModel):
+    """Resposta do upload em lote"""
+    batch_id: str
+    bot_id: str
+    total: int
+    document_ids: List[str] = []
+
+
+class BatchProgressResponse(BaseModel):
+    """Progresso agregado de um lote de upload"""
+    batch_id: str
+    total: int
+    processing: int
+    completed: int
+    failed: int
+    chunk_count: int
+    progress: float
+
+
 class ChatMessage(BaseModel):
     """Mensagem de chat"""
     bot_id: str
@@ -192,6 +286,32 @@ class ChatMessage(BaseModel):
     session_id: Optional[str] = None
 
 
+class FederatedSearchRequest(BaseModel):
+    """Busca federada em vários bots"""
+    query: str
+    bot_ids: Optional[List[str]] = None  # None = todos os bots com RAG
+    max_results: Optional[int] = None
+    timeout: Optional[float] = None
+
+
+class FederatedSearchResult(BaseModel):
+    """Trecho retornado pela busca federada"""
+    bot_id: str
+    content: str
+    source: str
+    similarity: float
+
+
+class FederatedSearchResponse(BaseModel):
+    """Resposta da busca federada"""
+    query: str
+    results: List[FederatedSearchResult] = []
+    searched: int
+    timed_out: List[str] = []
+    failed: List[str] = []
+    partial: bool = False
+
+
 class ChatResponse(BaseModel):
     """Resposta de chat"""
     bot_id: str
@@ -0,0 +1,280 @@
+"""
+Profiling - Profiler por amostragem para a API em execução
+Gera pilhas no formato "collapsed" (uma linha "frame;frame;frame contagem"),
+aceito por flamegraph.pl, speedscope e similares
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from types import FrameType
+from typing import Dict, Optional
+from shared.config import settings
+from app.diagnostics import APP_ROOT, admin_token_valid
+
+
+# Tipos de profile
+PROFILE_CPU = "cpu"      # Threads ativas (ignora threads paradas em select/wait)
+PROFILE_WALL = "wall"    # Todas as threads, inclusive ociosas
+PROFILE_TASKS = "tasks"  # Onde cada task asyncio está aguardando (await)
+
+# Frames mais internos guardados por amostra
+MAX_STACK_DEPTH = 64
+
+# Funções em que uma thread está ociosa (esperando I/O, lock ou trabalho)
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+def _label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(APP_ROOT):
+        filename = filename[len(APP_ROOT) + 1:]
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename})"
+
+
+def _fold_frame(frame: Optional[FrameType]) -> str:
+    """Pilha de uma thread, da raiz para a folha, separada por ';'"""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def _in_stack(frame: Optional[FrameType], target: Optional[FrameType]) -> bool:
+    """target está na pilha que termina em frame"""
+    while frame is not None and target is not None:
+        if frame is target:
+            return True
+        frame = frame.f_back
+    return False
+
+
+def _fold_task(task: asyncio.Task) -> str:
+    """Cadeia de awaits de uma task, da corrotina raiz até a que está suspensa"""
+    labels = []
+    coro = task.get_coro()
+    while coro is not None and len(labels) < MAX_STACK_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is not None:
+            labels.append(_label(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return ";".join(labels)
+
+
+def _is_idle(frame: FrameType) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+def _render(samples: Counter) -> str:
+    return "\n".join(f"{stack} {count}" for stack, count in samples.most_common()) + "\n"
+
+
+class SamplingProfiler:
+    """Captura profiles por tempo limitado e profiles de requisições individuais"""
+    
+    def __init__(self, interval_ms: Optional[float] = None, max_stored: Optional[int] = None):
+        self.interval = (interval_ms or settings.profiling_interval_ms) / 1000
+        self.max_stored = max_stored or settings.profiling_max_stored
+        
+        self._capture_lock = asyncio.Lock()
+        self._requests: "OrderedDict[str, Dict]" = OrderedDict()
+    
+    @property
+    def busy(self) -> bool:
+        return self._capture_lock.locked()
+    
+    async def capture(self, seconds: float, kind: str = PROFILE_CPU) -> Dict:
+        """Amostra o processo por `seconds` e devolve as pilhas agregadas"""
+        seconds = min(seconds, settings.profiling_max_seconds)
+        
+        async with self._capture_lock:
+            started = time.perf_counter()
+            if kind == PROFILE_TASKS:
+                samples, count = await self._sample_tasks(seconds)
+            else:
+                stop = threading.Event()
+                result = {}
+                thread = threading.Thread(
+                    target=self._sample_threads,
+                    args=(stop, kind == PROFILE_CPU, result),
+                    name="sampling-profiler",
+                    daemon=True
+                )
+                thread.start()
+                await asyncio.sleep(seconds)
+                stop.set()
+                await asyncio.to_thread(thread.join)
+                samples, count = result["samples"], result["count"]
+        
+        return {
+            "kind": kind,
+            "pid": os.getpid(),
+            "seconds": time.perf_counter() - started,
+            "samples": count,
+            "collapsed": _render(samples)
+        }
+    
+    def _sample_threads(self, stop: threading.Event, skip_idle: bool, result: Dict):
+        """Roda em thread: pilhas de todas as outras threads a cada intervalo"""
+        own_id = threading.get_ident()
+        samples = Counter()
+        count = 0
+        
+        while not stop.wait(self.interval):
+            count += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (skip_idle and _is_idle(frame)):
+                    continue
+                samples[_fold_frame(frame)] += 1
+        
+        result["samples"] = samples
+        result["count"] = count
+    
+    async def _sample_tasks(self, seconds: float):
+        """Roda no loop: cadeia de awaits de cada task, sempre que o loop fica livre"""
+        loop = asyncio.get_running_loop()
+        current = asyncio.current_task()
+        deadline = loop.time() + seconds
+        interval = max(self.interval, 0.01)
+        samples = Counter()
+        count = 0
+        
+        while loop.time() < deadline:
+            count += 1
+            for task in asyncio.all_tasks():
+                if task is not current and not task.done():
+                    samples[_fold_task(task)] += 1
+            await asyncio.sleep(interval)
+        
+        return samples, count
+    
+    def start_request(self, task: asyncio.Task) -> str:
+        """
+        Inicia o profile de uma requisição: só contam amostras em que a task
+        da requisição é a que está executando no event loop
+        """
+        profile_id = uuid.uuid4().hex[:16]
+        loop = task.get_loop()
+        stop = threading.Event()
+        entry = {
+            "id": profile_id,
+            "pid": os.getpid(),
+            "started": time.perf_counter(),
+            "seconds": None,
+            "samples": 0,
+            "collapsed": None,
+            "_stop": stop,
+            "_counter": Counter(),
+            "_thread": None
+        }
+        entry["_thread"] = threading.Thread(
+            target=self._sample_request,
+            args=(stop, loop, task, threading.get_ident(), entry),
+            name=f"request-profiler-{profile_id}",
+            daemon=True
+        )
+        entry["_thread"].start()
+        
+        self._requests[profile_id] = entry
+        while len(self._requests) > self.max_stored:
+            _, evicted = self._requests.popitem(last=False)
+            evicted["_stop"].set()
+        
+        return profile_id
+    
+    def _sample_request(self, stop: threading.Event, loop, task, loop_thread_id: int, entry: Dict):
+        # _current_tasks (privado): task em execução por loop, leitura atômica sob o GIL
+        # Sem ele (outras versões do Python), a task está executando quando o frame da
+        # corrotina raiz aparece na pilha da thread do loop
+        current_tasks = getattr(asyncio.tasks, "_current_tasks", None)
+        if not isinstance(current_tasks, dict):
+            current_tasks = None
+        root_frame = getattr(task.get_coro(), "cr_frame", None)
+        counter = entry["_counter"]
+        
+        while not stop.wait(self.interval):
+            if current_tasks is not None and current_tasks.get(loop) is not task:
+                continue
+            frame = sys._current_frames().get(loop_thread_id)
+            if frame is not None and (current_tasks is not None or _in_stack(frame, root_frame)):
+                counter[_fold_frame(frame)] += 1
+                entry["samples"] += 1
+            del frame
+    
+    async def finish_request(self, profile_id: str):
+        """Encerra o profile da requisição e guarda o resultado"""
+        entry = self._requests.get(profile_id)
+        if entry is None:
+            return
+        
+        entry["_stop"].set()
+        await asyncio.to_thread(entry["_thread"].join)
+        entry["seconds"] = time.perf_counter() - entry["started"]
+        entry["collapsed"] = _render(entry["_counter"])
+    
+    def get_request(self, profile_id: str) -> Optional[Dict]:
+        """Profile de uma requisição já concluída"""
+        entry = self._requests.get(profile_id)
+        if entry is None or entry["collapsed"] is None:
+            return None
+        return {key: value for key, value in entry.items() if not key.startswith("_") and key != "started"}
+    
+    def list_requests(self):
+        """Profiles de requisição guardados (mais recentes primeiro)"""
+        return [
+            {"id": entry["id"], "seconds": entry["seconds"], "samples": entry["samples"]}
+            for entry in reversed(self._requests.values())
+            if entry["collapsed"] is not None
+        ]
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI: requisições com header X-Profile são profiladas individualmente"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.profiling_enabled:
+            await self.app(scope, receive, send)
+            return
+        
+        headers = dict(scope["headers"])
+        token = headers.get(b"x-admin-token")
+        if b"x-profile" not in headers or not admin_token_valid(token.decode("latin-1") if token else None):
+            await self.app(scope, receive, send)
+            return
+        
+        profile_id = sampling_profiler.start_request(asyncio.current_task())
+        
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile_id.encode("ascii"))
+                ]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            await sampling_profiler.finish_request(profile_id)
+
+
+# Instância global
+sampling_profiler = SamplingProfiler()
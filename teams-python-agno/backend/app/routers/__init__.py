@@ -1,4 +1,4 @@
 """Routers package"""
-from . import bots, documents, chat
+from . import bots, documents, chat, search, admin
 
-__all__ = ["bots", "documents", "chat"]
+__all__ = ["bots", "documents", "chat", "search", "admin"]
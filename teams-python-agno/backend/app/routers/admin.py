@@ -0,0 +1,114 @@
+"""
+Admin Router - Diagnóstico de desempenho (staging)
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
+
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from app.diagnostics import blocking_detector, admin_token_valid
+from app.profiling import sampling_profiler, PROFILE_CPU, PROFILE_WALL, PROFILE_TASKS
+from app.serialization import FastJSONResponse
+from shared.config import settings
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(default=None)):
+    """Exige o header X-Admin-Token; sem ADMIN_TOKEN configurado as rotas ficam desativadas"""
+    if not settings.admin_token:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Administração desativada (ADMIN_TOKEN não configurado)"
+        )
+    if not admin_token_valid(x_admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Token de administração inválido"
+        )
+
+
+router = APIRouter(dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/blocking")
+async def get_blocking_report():
+    """
+    Pontos do código que bloquearam o event loop além do limite
+    Ordenados pelo tempo total bloqueado, com a pilha da última amostra
+    """
+    return FastJSONResponse(blocking_detector.report())
+
+
+@router.delete("/blocking", status_code=status.HTTP_204_NO_CONTENT)
+async def reset_blocking_report():
+    """Limpa o relatório de bloqueios"""
+    blocking_detector.reset()
+    return None
+
+
+def _require_profiling():
+    if not settings.profiling_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profiling desativado (PROFILING_ENABLED)"
+        )
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def capture_profile(
+    seconds: float = Query(10, gt=0),
+    kind: str = Query(PROFILE_CPU, pattern=f"^({PROFILE_CPU}|{PROFILE_WALL}|{PROFILE_TASKS})$")
+):
+    """
+    Profile por amostragem deste worker durante `seconds` (limitado a PROFILING_MAX_SECONDS)
+    cpu: threads ativas; wall: todas as threads; tasks: onde as tasks asyncio estão aguardando
+    Resposta em formato collapsed (flamegraph.pl, speedscope)
+    """
+    _require_profiling()
+    
+    if sampling_profiler.busy:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Já existe um profile em andamento neste worker"
+        )
+    
+    profile = await sampling_profiler.capture(seconds, kind)
+    
+    return PlainTextResponse(
+        profile["collapsed"],
+        headers={
+            "X-Profile-Pid": str(profile["pid"]),
+            "X-Profile-Samples": str(profile["samples"]),
+            "X-Profile-Seconds": f"{profile['seconds']:.3f}"
+        }
+    )
+
+
+@router.get("/profile/requests")
+async def list_request_profiles():
+    """Profiles de requisições (header X-Profile) guardados neste worker"""
+    _require_profiling()
+    return FastJSONResponse(sampling_profiler.list_requests())
+
+
+@router.get("/profile/requests/{profile_id}", response_class=PlainTextResponse)
+async def get_request_profile(profile_id: str):
+    """Profile de uma requisição, pelo X-Profile-Id devolvido na resposta"""
+    _require_profiling()
+    
+    profile = sampling_profiler.get_request(profile_id)
+    if not profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile não encontrado"
+        )
+    
+    return PlainTextResponse(
+        profile["collapsed"],
+        headers={
+            "X-Profile-Pid": str(profile["pid"]),
+            "X-Profile-Samples": str(profile["samples"]),
+            "X-Profile-Seconds": f"{profile['seconds']:.3f}"
+        }
+    )
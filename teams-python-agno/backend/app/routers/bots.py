@@ -5,12 +5,15 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
 
-from fastapi import APIRouter, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Dict, List, Optional
+from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
 from app.database import get_database
 from app.models import BotCreate, BotResponse, BotModel
-from app.services import chroma_service
+from app.serialization import BOT_PROJECTION, FastJSONResponse
+from app.services import vector_service, response_cache, bot_cache
 
 
 router = APIRouter()
@@ -42,26 +45,41 @@ async def create_bot(bot: BotCreate):
     )
 
 
+async def _document_stats(db, bot_ids: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """Contagem de documentos e chunks por bot em uma única agregação"""
+    pipeline = []
+    if bot_ids is not None:
+        pipeline.append({"$match": {"bot_id": {"$in": bot_ids}}})
+    pipeline.append({
+        "$group": {
+            "_id": "$bot_id",
+            "document_count": {"$sum": 1},
+            "chunk_count": {"$sum": "$chunk_count"}
+        }
+    })
+    
+    stats = {}
+    async for row in db.documents.aggregate(pipeline):
+        stats[row["_id"]] = row
+    return stats
+
+
 @router.get("/", response_model=List[BotResponse])
 async def list_bots():
-    """Lista todos os bots"""
+    """Lista todos os bots com contagem de documentos e chunks (2 consultas no total)"""
     db = get_database()
     
+    stats = await _document_stats(db)
+    
+    # Projeção já no formato da resposta: só acrescenta as contagens
     bots = []
-    cursor = db.bots.find()
-    
-    async for bot in cursor:
-        bots.append(BotResponse(
-            id=str(bot["_id"]),
-            name=bot["name"],
-            description=bot["description"],
-            instructions=bot["instructions"],
-            enable_rag=bot["enable_rag"],
-            created_at=bot["created_at"],
-            updated_at=bot["updated_at"]
-        ))
-    
-    return bots
+    async for bot in db.bots.aggregate([{"$project": BOT_PROJECTION}]):
+        bot_stats = stats.get(bot["id"], {})
+        bot["document_count"] = bot_stats.get("document_count", 0)
+        bot["chunk_count"] = bot_stats.get("chunk_count", 0)
+        bots.append(bot)
+    
+    return FastJSONResponse(bots)
 
 
 @router.get("/{bot_id}", response_model=BotResponse)
@@ -85,6 +103,8 @@ async def get_bot(bot_id: str):
             detail="Bot não encontrado"
         )
     
+    bot_stats = (await _document_stats(db, [bot_id])).get(bot_id, {})
+    
     return BotResponse(
         id=str(bot["_id"]),
         name=bot["name"],
@@ -92,12 +112,57 @@ async def get_bot(bot_id: str):
         instructions=bot["instructions"],
         enable_rag=bot["enable_rag"],
         created_at=bot["created_at"],
-        updated_at=bot["updated_at"]
+        updated_at=bot["updated_at"],
+        document_count=bot_stats.get("document_count", 0),
+        chunk_count=bot_stats.get("chunk_count", 0)
+    )
+
+
+@router.put("/{bot_id}", response_model=BotResponse)
+async def update_bot(bot_id: str, bot: BotCreate):
+    """Atualiza um bot"""
+    db = get_database()
+    
+    # Valida ObjectId
+    if not ObjectId.is_valid(bot_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ID de bot inválido"
+        )
+    
+    # Atualiza bot
+    updated_bot = await db.bots.find_one_and_update(
+        {"_id": ObjectId(bot_id)},
+        {"$set": {**bot.model_dump(), "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    
+    if not updated_bot:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bot não encontrado"
+        )
+    
+    # Instruções mudaram: descarta configuração em cache
+    await bot_cache.invalidate(bot_id)
+    
+    bot_stats = (await _document_stats(db, [bot_id])).get(bot_id, {})
+    
+    return BotResponse(
+        id=str(updated_bot["_id"]),
+        name=updated_bot["name"],
+        description=updated_bot["description"],
+        instructions=updated_bot["instructions"],
+        enable_rag=updated_bot["enable_rag"],
+        created_at=updated_bot["created_at"],
+        updated_at=updated_bot["updated_at"],
+        document_count=bot_stats.get("document_count", 0),
+        chunk_count=bot_stats.get("chunk_count", 0)
     )
 
 
 @router.delete("/{bot_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_bot(bot_id: str):
+async def delete_bot(bot_id: str, store=Depends(vector_service)):
     """Deleta um bot e seus documentos"""
     db = get_database()
     
@@ -120,7 +185,9 @@ async def delete_bot(bot_id: str):
     # Deleta documentos do bot
     await db.documents.delete_many({"bot_id": bot_id})
     
-    # Deleta collection no ChromaDB
-    await chroma_service.delete_bot_documents(bot_id)
+    # Deleta collection no vector store
+    await store.delete_bot_documents(bot_id)
+    await response_cache.invalidate_bot(bot_id)
+    await bot_cache.invalidate(bot_id)
     
     return None
@@ -5,12 +5,20 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
 
-from fastapi import APIRouter, HTTPException, status
-import agentops
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from typing import Dict, Optional, Tuple
+from datetime import datetime
+import base64
 from bson import ObjectId
+from sqlalchemy import select, tuple_
+from app import database
 from app.database import get_database
-from app.models import ChatMessage, ChatResponse
-from app.agents import chat_agent
+from app.models import ChatMessage, ChatResponse, Message
+from app.serialization import FastJSONResponse, dumps
+from app.agents import chat_agent, ChatAgent
+from app.services import history_writer, bot_cache
+from app.metrics import observe_stage
 import uuid
 
 
@@ -18,13 +26,11 @@ router = APIRouter()
 
 
 @router.post("/", response_model=ChatResponse)
-async def chat(message: ChatMessage):
+async def chat(message: ChatMessage, agent: ChatAgent = Depends(chat_agent)):
     """
     Endpoint de chat com RAG
     AgentOps rastreia automaticamente esta sessão
     """
-    db = get_database()
-    
     # Valida bot_id
     if not ObjectId.is_valid(message.bot_id):
         raise HTTPException(
@@ -32,8 +38,9 @@ async def chat(message: ChatMessage):
             detail="ID de bot inválido"
         )
     
-    # Busca bot
-    bot = await db.bots.find_one({"_id": ObjectId(message.bot_id)})
+    # Busca bot (cache em memória; banco só em miss)
+    with observe_stage("bot_lookup"):
+        bot = await bot_cache.get(message.bot_id)
     if not bot:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -45,11 +52,12 @@ async def chat(message: ChatMessage):
     
     try:
         # Usa agente de chat
-        result = await chat_agent.chat_with_rag(
+        result = await agent.chat_with_rag(
             bot_id=message.bot_id,
-            bot_instructions=bot["instructions"],
+            bot_instructions=bot.instructions,
             user_message=message.message,
-            enable_rag=bot.get("enable_rag", True)
+            enable_rag=bot.enable_rag,
+            session_id=session_id
         )
         
         # Salva no histórico
@@ -60,10 +68,12 @@ async def chat(message: ChatMessage):
             "response": result["response"],
             "sources": result["sources"],
             "model": result.get("model"),
-            "tokens_used": result.get("tokens_used", 0)
+            "tokens_used": result.get("tokens_used", 0),
+            "timestamp": datetime.utcnow()
         }
         
-        await db.chat_history.insert_one(history_entry)
+        # Gravação em lote fora do caminho da resposta
+        await history_writer.add_chat_entry(history_entry)
         
         # Retorna resposta
         return ChatResponse(
@@ -82,29 +92,151 @@ async def chat(message: ChatMessage):
         )
 
 
-@router.get("/history")
-async def get_chat_history(bot_id: str = None, session_id: str = None, limit: int = 50):
-    """Busca histórico de chat"""
-    db = get_database()
-    
+def _encode_cursor(timestamp: Optional[datetime], last_id: str) -> str:
+    """Cursor opaco com a chave (timestamp, id) do último item da página (timestamp vazio = sem timestamp)"""
+    raw = f"{timestamp.isoformat() if timestamp else ''}|{last_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple[Optional[datetime], str]:
+    """Decodifica cursor gerado por _encode_cursor"""
+    try:
+        timestamp, last_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+        return (datetime.fromisoformat(timestamp) if timestamp else None), last_id
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor inválido"
+        )
+
+
+def _history_query(bot_id: Optional[str], session_id: Optional[str]) -> Dict:
     query = {}
     if bot_id:
         query["bot_id"] = bot_id
     if session_id:
         query["session_id"] = session_id
+    return query
+
+
+def _format_history_entry(entry: Dict) -> Dict:
+    return {
+        "id": str(entry["_id"]),
+        "bot_id": entry["bot_id"],
+        "session_id": entry.get("session_id"),
+        "message": entry["message"],
+        "response": entry["response"],
+        "sources": entry.get("sources", []),
+        "timestamp": entry.get("timestamp")
+    }
+
+
+@router.get("/history")
+async def get_chat_history(
+    bot_id: str = None,
+    session_id: str = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = None
+):
+    """
+    Busca histórico de chat (mais recentes primeiro)
+    Paginação por cursor: use next_cursor da resposta para a próxima página
+    """
+    db = get_database()
+    
+    query = _history_query(bot_id, session_id)
+    if cursor:
+        timestamp, last_id = _decode_cursor(cursor)
+        if not ObjectId.is_valid(last_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor inválido"
+            )
+        # Keyset: itens estritamente depois de (timestamp, _id) na ordem decrescente
+        # Registros antigos sem timestamp ficam no fim da ordenação, ordenados só por _id
+        if timestamp is None:
+            query["timestamp"] = None
+            query["_id"] = {"$lt": ObjectId(last_id)}
+        else:
+            query["$or"] = [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "_id": {"$lt": ObjectId(last_id)}},
+                {"timestamp": None}
+            ]
+    
+    items = []
+    entries = db.chat_history.find(query).sort([("timestamp", -1), ("_id", -1)]).limit(limit + 1)
+    async for entry in entries:
+        items.append(entry)
+    
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = _encode_cursor(last.get("timestamp"), str(last["_id"]))
+    
+    return FastJSONResponse({
+        "items": [_format_history_entry(entry) for entry in items],
+        "next_cursor": next_cursor
+    })
+
+
+@router.get("/history/export")
+async def export_chat_history(bot_id: str = None, session_id: str = None):
+    """Exporta o histórico completo como NDJSON (uma linha por registro, em streaming)"""
+    db = get_database()
+    
+    async def _stream():
+        entries = db.chat_history.find(_history_query(bot_id, session_id)) \
+            .sort([("timestamp", -1), ("_id", -1)]) \
+            .batch_size(1000)
+        async for entry in entries:
+            yield dumps(_format_history_entry(entry)) + b"\n"
+    
+    return StreamingResponse(_stream(), media_type="application/x-ndjson")
+
+
+@router.get("/conversations/{conversation_id}/messages")
+async def get_conversation_messages(
+    conversation_id: str,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = None
+):
+    """
+    Mensagens de uma conversa em ordem cronológica (SQLite/PostgreSQL)
+    Paginação por cursor sobre o índice (conversation_id, created_at, id)
+    """
+    if database.async_read_session_maker is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Mensagens de conversa exigem banco SQL (SQLite/PostgreSQL)"
+        )
+    
+    query = (
+        select(Message)
+        .where(Message.conversation_id == conversation_id)
+        .order_by(Message.created_at, Message.id)
+        .limit(limit + 1)
+    )
+    if cursor:
+        created_at, last_id = _decode_cursor(cursor)
+        if created_at is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor inválido"
+            )
+        query = query.where(tuple_(Message.created_at, Message.id) > tuple_(created_at, last_id))
     
-    history = []
-    cursor = db.chat_history.find(query).sort("timestamp", -1).limit(limit)
+    async with database.async_read_session_maker() as session:
+        result = await session.execute(query)
+        messages = result.scalars().all()
     
-    async for entry in cursor:
-        history.append({
-            "id": str(entry["_id"]),
-            "bot_id": entry["bot_id"],
-            "session_id": entry.get("session_id"),
-            "message": entry["message"],
-            "response": entry["response"],
-            "sources": entry.get("sources", []),
-            "timestamp": entry.get("timestamp")
-        })
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = _encode_cursor(messages[-1].created_at, messages[-1].id)
     
-    return history
+    return FastJSONResponse({
+        "items": [message.to_dict() for message in messages],
+        "next_cursor": next_cursor
+    })
@@ -6,14 +6,24 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
 
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status, BackgroundTasks
-from typing import List
+from typing import List, Dict
+from datetime import datetime
+import asyncio
 import aiofiles
 from bson import ObjectId
 import uuid
 from app.database import get_database
-from app.models import DocumentResponse
-from app.services import rag_service
-from shared.config import UPLOADS_DIR
+from app.models import (
+    DocumentResponse,
+    BulkUploadResponse,
+    BatchProgressResponse,
+    IngestionStatsResponse,
+    IngestionStageStats
+)
+from app.serialization import DOCUMENT_PROJECTION, json_array_response
+from app.services import rag_service, response_cache
+from app.metrics import record_ingestion, INGESTION_QUEUED, INGESTION_IN_PROGRESS
+from shared.config import settings, UPLOADS_DIR
 
 
 router = APIRouter()
@@ -28,6 +38,26 @@ ALLOWED_TYPES = {
 }
 
 
+# Limite global de documentos processados ao mesmo tempo (uploads simples e em lote)
+_ingestion_semaphore = asyncio.Semaphore(settings.ingestion_max_concurrency)
+
+# Tamanho do bloco ao gravar uploads em disco
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Etapas da ingestão, na ordem em que são executadas
+INGESTION_STAGES = ("extract", "split", "embed", "upsert")
+
+
+async def _save_upload(file: UploadFile, file_path: Path) -> int:
+    """Grava o upload em disco em blocos, sem carregar o arquivo inteiro na memória"""
+    size = 0
+    async with aiofiles.open(file_path, 'wb') as f:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await f.write(chunk)
+            size += len(chunk)
+    return size
+
+
 async def process_document_background(
     doc_id: str,
     bot_id: str,
@@ -36,31 +66,79 @@ async def process_document_background(
     content_type: str
 ):
     """Processa documento em background"""
+    INGESTION_QUEUED.inc()
+    try:
+        await _ingestion_semaphore.acquire()
+    finally:
+        INGESTION_QUEUED.dec()
+    
+    try:
+        with INGESTION_IN_PROGRESS.track_inprogress():
+            await _process_document(doc_id, bot_id, file_path, filename, content_type)
+    finally:
+        _ingestion_semaphore.release()
+
+
+async def process_batch_background(items: List[Dict]):
+    """Processa os documentos de um lote em paralelo, respeitando o limite global"""
+    await asyncio.gather(*(
+        process_document_background(**item)
+        for item in items
+    ))
+
+
+async def _process_document(
+    doc_id: str,
+    bot_id: str,
+    file_path: str,
+    filename: str,
+    content_type: str
+):
     db = get_database()
+    doc_filter = {"_id": ObjectId(doc_id)}
+    
+    async def _report_stage(stage: str):
+        await db.documents.update_one(doc_filter, {"$set": {"ingestion.stage": stage}})
     
     try:
         # Processa com RAG
-        chunk_count = await rag_service.process_document(
+        rag = await rag_service.aget()
+        stats = await rag.process_document(
             bot_id=bot_id,
             file_path=file_path,
             filename=filename,
-            content_type=content_type
+            content_type=content_type,
+            on_stage=_report_stage
         )
         
-        # Atualiza status
+        # Atualiza status e telemetria
         await db.documents.update_one(
-            {"_id": ObjectId(doc_id)},
-            {"$set": {"status": "completed", "chunk_count": chunk_count}}
+            doc_filter,
+            {"$set": {
+                "status": "completed",
+                "chunk_count": stats["chunks"],
+                "ingestion": {**stats, "stage": "done", "completed_at": datetime.utcnow()}
+            }}
         )
         
-        print(f"✅ Documento processado: {filename} ({chunk_count} chunks)")
+        # Novos documentos: respostas cacheadas do bot ficam desatualizadas
+        await response_cache.invalidate_bot(bot_id)
+        record_ingestion(stats)
+        
+        timings = stats["timings_ms"]
+        print(
+            f"✅ Documento processado: {filename} ({stats['chunks']} chunks, {timings['total']:.0f} ms; "
+            + ", ".join(f"{stage} {timings[stage]:.0f} ms" for stage in INGESTION_STAGES)
+            + ")"
+        )
         
     except Exception as e:
-        # Marca como falha
+        # Marca como falha, mantendo a etapa em que parou
         await db.documents.update_one(
-            {"_id": ObjectId(doc_id)},
-            {"$set": {"status": "failed"}}
+            doc_filter,
+            {"$set": {"status": "failed", "ingestion.error": str(e)}}
         )
+        record_ingestion(None)
         print(f"❌ Erro ao processar documento: {e}")
 
 
@@ -100,18 +178,18 @@ async def upload_document(
     file_id = str(uuid.uuid4())
     file_path = UPLOADS_DIR / f"{file_id}{file_ext}"
     
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
+    file_size = await _save_upload(file, file_path)
     
     # Cria documento no MongoDB
     document = {
         "bot_id": bot_id,
         "filename": file.filename,
         "content_type": file.content_type,
-        "file_size": len(content),
+        "file_size": file_size,
         "status": "processing",
-        "chunk_count": 0
+        "chunk_count": 0,
+        "ingestion": {"stage": "queued"},
+        "created_at": datetime.utcnow()
     }
     
     result = await db.documents.insert_one(document)
@@ -138,35 +216,191 @@ async def upload_document(
         file_size=created_doc["file_size"],
         status=created_doc["status"],
         chunk_count=created_doc["chunk_count"],
+        ingestion=created_doc.get("ingestion"),
         created_at=created_doc["created_at"]
     )
 
 
-@router.get("/", response_model=List[DocumentResponse])
-async def list_documents(bot_id: str = None):
-    """Lista documentos (opcionalmente filtrado por bot)"""
+@router.post("/bulk", response_model=BulkUploadResponse, status_code=status.HTTP_202_ACCEPTED)
+async def upload_documents_bulk(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    bot_id: str = Form(...)
+):
+    """
+    Upload de vários documentos em uma única requisição multipart
+    Registra todos em uma operação e processa em paralelo; acompanhe pelo batch_id
+    """
     db = get_database()
     
-    query = {}
+    # Valida bot_id
+    if not ObjectId.is_valid(bot_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ID de bot inválido"
+        )
+    
+    # Verifica se bot existe
+    bot = await db.bots.find_one({"_id": ObjectId(bot_id)}, {"_id": 1})
+    if not bot:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bot não encontrado"
+        )
+    
+    # Valida todos os tipos antes de gravar qualquer arquivo
+    unsupported = [f.filename for f in files if f.content_type not in ALLOWED_TYPES]
+    if unsupported:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Tipo de arquivo não suportado: {', '.join(unsupported)}. Tipos permitidos: {', '.join(ALLOWED_TYPES.keys())}"
+        )
+    
+    batch_id = str(uuid.uuid4())
+    
+    # Salva arquivos em paralelo
+    file_paths = [UPLOADS_DIR / f"{uuid.uuid4()}{ALLOWED_TYPES[f.content_type]}" for f in files]
+    sizes = await asyncio.gather(*(
+        _save_upload(f, path) for f, path in zip(files, file_paths)
+    ))
+    
+    # Registra todos os documentos de uma vez
+    now = datetime.utcnow()
+    documents = [
+        {
+            "bot_id": bot_id,
+            "batch_id": batch_id,
+            "filename": f.filename,
+            "content_type": f.content_type,
+            "file_size": size,
+            "status": "processing",
+            "chunk_count": 0,
+            "ingestion": {"stage": "queued"},
+            "created_at": now
+        }
+        for f, size in zip(files, sizes)
+    ]
+    result = await db.documents.insert_many(documents)
+    
+    # Processa o lote em background
+    background_tasks.add_task(process_batch_background, [
+        {
+            "doc_id": str(doc_id),
+            "bot_id": bot_id,
+            "file_path": str(path),
+            "filename": f.filename,
+            "content_type": f.content_type
+        }
+        for doc_id, f, path in zip(result.inserted_ids, files, file_paths)
+    ])
+    
+    return BulkUploadResponse(
+        batch_id=batch_id,
+        bot_id=bot_id,
+        total=len(documents),
+        document_ids=[str(doc_id) for doc_id in result.inserted_ids]
+    )
+
+
+@router.get("/batches/{batch_id}", response_model=BatchProgressResponse)
+async def get_batch_progress(batch_id: str):
+    """Progresso agregado de um lote de upload"""
+    db = get_database()
+    
+    counts = {}
+    chunk_count = 0
+    async for row in db.documents.aggregate([
+        {"$match": {"batch_id": batch_id}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}, "chunks": {"$sum": "$chunk_count"}}}
+    ]):
+        counts[row["_id"]] = row["count"]
+        chunk_count += row["chunks"]
+    
+    if not counts:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Lote não encontrado"
+        )
+    
+    total = sum(counts.values())
+    completed = counts.get("completed", 0)
+    failed = counts.get("failed", 0)
+    
+    return BatchProgressResponse(
+        batch_id=batch_id,
+        total=total,
+        processing=counts.get("processing", 0),
+        completed=completed,
+        failed=failed,
+        chunk_count=chunk_count,
+        progress=(completed + failed) / total
+    )
+
+
+@router.get("/ingestion/stats", response_model=IngestionStatsResponse)
+async def get_ingestion_stats(bot_id: str = None):
+    """
+    Agrega a telemetria de ingestão dos documentos concluídos
+    Mostra o tempo médio de cada etapa e qual delas domina o processamento
+    """
+    db = get_database()
+    
+    match = {"status": "completed", "ingestion.timings_ms": {"$exists": True}}
     if bot_id:
-        query["bot_id"] = bot_id
+        match["bot_id"] = bot_id
+    
+    group = {
+        "_id": None,
+        "documents": {"$sum": 1},
+        "total_bytes": {"$sum": "$ingestion.bytes"},
+        "total_pages": {"$sum": {"$ifNull": ["$ingestion.pages", 0]}},
+        "total_chunks": {"$sum": "$ingestion.chunks"},
+        "total_tokens": {"$sum": "$ingestion.tokens"},
+    }
+    for stage in INGESTION_STAGES:
+        group[f"{stage}_sum"] = {"$sum": f"$ingestion.timings_ms.{stage}"}
+        group[f"{stage}_max"] = {"$max": f"$ingestion.timings_ms.{stage}"}
+    
+    rows = await db.documents.aggregate([{"$match": match}, {"$group": group}]).to_list(1)
+    row = rows[0] if rows else {}
+    
+    documents = row.get("documents", 0)
+    total_ms = sum(row.get(f"{stage}_sum", 0) for stage in INGESTION_STAGES)
+    stages = {
+        stage: IngestionStageStats(
+            avg_ms=row.get(f"{stage}_sum", 0) / documents if documents else 0.0,
+            max_ms=row.get(f"{stage}_max") or 0.0,
+            share=row.get(f"{stage}_sum", 0) / total_ms if total_ms else 0.0
+        )
+        for stage in INGESTION_STAGES
+    }
     
-    documents = []
-    cursor = db.documents.find(query)
+    return IngestionStatsResponse(
+        bot_id=bot_id,
+        documents=documents,
+        total_bytes=row.get("total_bytes", 0),
+        total_pages=row.get("total_pages", 0),
+        total_chunks=row.get("total_chunks", 0),
+        total_tokens=row.get("total_tokens", 0),
+        stages=stages,
+        dominant_stage=max(stages, key=lambda stage: stages[stage].share) if total_ms else None
+    )
+
+
+@router.get("/", response_model=List[DocumentResponse])
+async def list_documents(bot_id: str = None):
+    """
+    Lista documentos (opcionalmente filtrado por bot)
+    Projeção no MongoDB já no formato da resposta, codificada em streaming com orjson
+    """
+    db = get_database()
     
-    async for doc in cursor:
-        documents.append(DocumentResponse(
-            id=str(doc["_id"]),
-            bot_id=doc["bot_id"],
-            filename=doc["filename"],
-            content_type=doc["content_type"],
-            file_size=doc["file_size"],
-            status=doc["status"],
-            chunk_count=doc["chunk_count"],
-            created_at=doc["created_at"]
-        ))
+    pipeline = []
+    if bot_id:
+        pipeline.append({"$match": {"bot_id": bot_id}})
+    pipeline.append({"$project": DOCUMENT_PROJECTION})
     
-    return documents
+    return json_array_response(db.documents.aggregate(pipeline, batchSize=1000))
 
 
 @router.delete("/{doc_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -182,12 +416,14 @@ async def delete_document(doc_id: str):
         )
     
     # Deleta documento
-    result = await db.documents.delete_one({"_id": ObjectId(doc_id)})
+    document = await db.documents.find_one_and_delete({"_id": ObjectId(doc_id)})
     
-    if result.deleted_count == 0:
+    if not document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Documento não encontrado"
         )
     
+    await response_cache.invalidate_bot(document["bot_id"])
+    
     return None
@@ -0,0 +1,56 @@
+"""
+Search Router
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
+
+from fastapi import APIRouter, Depends
+from app.database import get_database
+from app.models import FederatedSearchRequest, FederatedSearchResponse, FederatedSearchResult
+from app.services import rag_service, RAGService
+
+
+router = APIRouter()
+
+
+@router.post("/", response_model=FederatedSearchResponse)
+async def federated_search(
+    request: FederatedSearchRequest,
+    rag: RAGService = Depends(rag_service)
+):
+    """
+    Busca federada em vários bots ao mesmo tempo
+    Retorna resultados parciais se alguma collection demorar demais
+    """
+    bot_ids = request.bot_ids
+    
+    # Sem bots informados: busca em todos com RAG habilitado
+    if not bot_ids:
+        db = get_database()
+        cursor = db.bots.find({"enable_rag": True}, {"_id": 1})
+        bot_ids = [str(bot["_id"]) async for bot in cursor]
+    
+    result = await rag.search_federated(
+        bot_ids=bot_ids,
+        query=request.query,
+        max_results=request.max_results,
+        timeout=request.timeout
+    )
+    
+    return FederatedSearchResponse(
+        query=request.query,
+        results=[
+            FederatedSearchResult(
+                bot_id=doc["bot_id"],
+                content=doc["content"],
+                source=doc["source"],
+                similarity=doc["similarity"]
+            )
+            for doc in result["results"]
+        ],
+        searched=result["searched"],
+        timed_out=result["timed_out"],
+        failed=result["failed"],
+        partial=result["partial"]
+    )
@@ -0,0 +1,79 @@
+"""
+Serialização rápida de respostas com orjson
+Linhas do banco vão direto para bytes JSON, sem modelos Pydantic intermediários
+"""
+from typing import Any, AsyncIterable, AsyncIterator, Dict
+import orjson
+from bson import ObjectId
+from fastapi.responses import ORJSONResponse, StreamingResponse
+
+
+# Projeções MongoDB já no formato da API: id como string, sem _id
+BOT_PROJECTION = {
+    "_id": 0,
+    "id": {"$toString": "$_id"},
+    "name": 1,
+    "description": 1,
+    "instructions": 1,
+    "enable_rag": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
+
+DOCUMENT_PROJECTION = {
+    "_id": 0,
+    "id": {"$toString": "$_id"},
+    "bot_id": 1,
+    "filename": 1,
+    "content_type": 1,
+    "file_size": 1,
+    "status": 1,
+    "chunk_count": 1,
+    "ingestion": 1,
+    "created_at": 1,
+}
+
+
+def _default(obj: Any) -> Any:
+    """Tipos que o orjson não conhece nativamente"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Tipo não serializável: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    """orjson com suporte a ObjectId (datetime/UUID são nativos)"""
+    return orjson.dumps(obj, default=_default)
+
+
+class FastJSONResponse(ORJSONResponse):
+    """ORJSONResponse que também aceita ObjectId"""
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+async def iter_json_array(rows: AsyncIterable[Dict], batch_size: int = 500) -> AsyncIterator[bytes]:
+    """Codifica linhas como um array JSON em blocos, sem materializar a lista inteira"""
+    buffer = [b"["]
+    first = True
+    count = 0
+    
+    async for row in rows:
+        if not first:
+            buffer.append(b",")
+        buffer.append(dumps(row))
+        first = False
+        count += 1
+        
+        if count % batch_size == 0:
+            yield b"".join(buffer)
+            buffer = []
+    
+    buffer.append(b"]")
+    yield b"".join(buffer)
+
+
+def json_array_response(rows: AsyncIterable[Dict], batch_size: int = 500) -> StreamingResponse:
+    """Resposta em streaming para listagens grandes"""
+    return StreamingResponse(iter_json_array(rows, batch_size), media_type="application/json")
@@ -1,10 +1,28 @@
 """Services package"""
-from .chromadb_service import chroma_service, ChromaDBService
+from .chromadb_service import ChromaDBService
+from .vector_service import vector_service, AdapterVectorService
 from .rag_service import rag_service, RAGService
+from .context_packer import context_packer, ContextPacker
+from .response_cache import response_cache, SemanticResponseCache
+from .conversation_memory import conversation_memory, ConversationMemory
+from .history_writer import history_writer, HistoryWriter
+from .bot_cache import bot_cache, BotConfigCache, BotConfig
 
 __all__ = [
-    "chroma_service",
     "ChromaDBService",
+    "vector_service",
+    "AdapterVectorService",
     "rag_service",
     "RAGService",
+    "context_packer",
+    "ContextPacker",
+    "response_cache",
+    "SemanticResponseCache",
+    "conversation_memory",
+    "ConversationMemory",
+    "history_writer",
+    "HistoryWriter",
+    "bot_cache",
+    "BotConfigCache",
+    "BotConfig",
 ]
@@ -0,0 +1,103 @@
+"""
+Bot Config Cache - Configuração dos bots em memória para o caminho do chat
+TTL + invalidação explícita; o change feed avisa os outros workers
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
+
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from bson import ObjectId
+from shared.config import settings
+from app.database import get_database
+from app.adapters.single_flight import SingleFlight
+from app.adapters.change_feed import ChangeFeed, change_feed as default_change_feed
+
+
+@dataclass(frozen=True, slots=True)
+class BotConfig:
+    """Configuração imutável e compacta de um bot"""
+    id: str
+    name: str
+    instructions: str
+    enable_rag: bool
+
+
+class BotConfigCache:
+    """Cache de BotConfig por id, com TTL e invalidação compartilhada entre processos"""
+    
+    CHANGE_TOPIC = "bot_config"
+    
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        change_feed: Optional[ChangeFeed] = None
+    ):
+        self.ttl = ttl or settings.bot_cache_ttl
+        
+        self._entries: Dict[str, Tuple[BotConfig, float]] = {}
+        self._loads = SingleFlight()
+        
+        self.change_feed = change_feed or default_change_feed
+        self.change_feed.subscribe(self.CHANGE_TOPIC, self._on_change)
+        
+        self.hits = 0
+        self.misses = 0
+    
+    def _on_change(self, bot_id: Optional[str], event: Dict):
+        """Outro worker alterou o bot (bot_id None: feed rotacionado, descarta tudo)"""
+        if bot_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(bot_id, None)
+    
+    async def get(self, bot_id: str) -> Optional[BotConfig]:
+        """Retorna a configuração do bot, indo ao banco só em miss ou expiração"""
+        entry = self._entries.get(bot_id)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            self.hits += 1
+            return entry[0]
+        
+        self.misses += 1
+        # Misses concorrentes do mesmo bot compartilham uma única consulta
+        config = await self._loads.do(bot_id, lambda: self._load(bot_id))
+        if config is not None:
+            self._entries[bot_id] = (config, time.monotonic())
+        return config
+    
+    async def _load(self, bot_id: str) -> Optional[BotConfig]:
+        db = get_database()
+        bot = await db.bots.find_one(
+            {"_id": ObjectId(bot_id)},
+            {"name": 1, "instructions": 1, "enable_rag": 1}
+        )
+        if not bot:
+            return None
+        
+        return BotConfig(
+            id=str(bot["_id"]),
+            name=bot["name"],
+            instructions=bot["instructions"],
+            enable_rag=bot.get("enable_rag", True)
+        )
+    
+    async def invalidate(self, bot_id: str):
+        """Remove o bot do cache local e avisa os outros workers"""
+        self._entries.pop(bot_id, None)
+        await self.change_feed.publish(self.CHANGE_TOPIC, bot_id)
+    
+    def stats(self) -> Dict:
+        """Estatísticas de uso do cache"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "entries": len(self._entries)
+        }
+
+
+# Instância global
+bot_cache = BotConfigCache()
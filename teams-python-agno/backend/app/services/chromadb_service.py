@@ -1,9 +1,8 @@
 """
 ChromaDB Service - Vector Database
 """
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-from typing import List, Dict, Optional
+import asyncio
+from typing import List, Dict, Tuple
 from shared.config import settings
 import uuid
 
@@ -12,6 +11,14 @@ class ChromaDBService:
     """Serviço para gerenciar ChromaDB"""
     
     def __init__(self):
+        # Import tardio: chromadb é a dependência mais pesada da API
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+        from chromadb.errors import ChromaError
+        
+        # Collection inexistente: ValueError (0.4.x) ou NotFoundError (versões novas)
+        self._missing_errors = (ValueError, ChromaError)
+        
         # Inicializa cliente ChromaDB
         self.client = chromadb.PersistentClient(
             path=settings.chromadb_path,
@@ -32,6 +39,13 @@ class ChromaDBService:
         
         return collection
     
+    def get_collection(self, bot_id: str):
+        """Obtém a collection de um bot sem criá-la (None se não existir)"""
+        try:
+            return self.client.get_collection(name=f"bot_{bot_id}")
+        except self._missing_errors:
+            return None
+    
     async def add_documents(
         self,
         bot_id: str,
@@ -59,17 +73,41 @@ class ChromaDBService:
         self,
         bot_id: str,
         query_embedding: List[float],
-        n_results: int = 5
+        n_results: int = 5,
+        include_embeddings: bool = False
     ) -> Dict:
         """Busca documentos similares"""
-        collection = self.get_or_create_collection(bot_id)
+        results, _ = await self.search_with_space(bot_id, query_embedding, n_results, include_embeddings)
+        return results
+    
+    async def search_with_space(
+        self,
+        bot_id: str,
+        query_embedding: List[float],
+        n_results: int = 5,
+        include_embeddings: bool = False
+    ) -> Tuple[Dict, str]:
+        """
+        Busca documentos similares e retorna também a métrica de distância (l2, cosine ou ip)
+        Bot sem collection (inexistente ou removido) não tem resultados; nada é criado na leitura
+        """
+        # Chamadas do Chroma são síncronas: rodam em thread para não travar o event loop
+        collection = await asyncio.to_thread(self.get_collection, bot_id)
+        if collection is None:
+            return {"documents": [[]], "metadatas": [[]], "distances": [[]]}, "l2"
+        
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
         
-        results = collection.query(
+        results = await asyncio.to_thread(
+            collection.query,
             query_embeddings=[query_embedding],
-            n_results=n_results
+            n_results=n_results,
+            include=include
         )
         
-        return results
+        return results, (collection.metadata or {}).get("hnsw:space", "l2")
     
     async def delete_bot_documents(self, bot_id: str):
         """Deleta todos documentos de um bot"""
@@ -83,11 +121,7 @@ class ChromaDBService:
     async def get_collection_count(self, bot_id: str) -> int:
         """Retorna número de documentos na collection"""
         try:
-            collection = self.get_or_create_collection(bot_id)
-            return collection.count()
+            collection = self.get_collection(bot_id)
+            return collection.count() if collection is not None else 0
         except:
             return 0
-
-
-# Instância global
-chroma_service = ChromaDBService()
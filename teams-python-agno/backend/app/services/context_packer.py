@@ -0,0 +1,111 @@
+"""
+Context Packer - Monta o contexto RAG dentro de um orçamento de tokens
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
+
+from typing import List, Dict, Optional
+from shared.config import settings
+from app.dependencies import LazyService
+
+
+class ContextPacker:
+    """Seleciona e formata chunks recuperados respeitando um limite de tokens"""
+    
+    def __init__(self, token_budget: Optional[int] = None, model: Optional[str] = None):
+        self.token_budget = token_budget or settings.context_token_budget
+        self.min_trim_tokens = settings.context_min_trim_tokens
+        
+        try:
+            import tiktoken
+            try:
+                self.encoding = tiktoken.encoding_for_model(model or settings.chat_model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # Sem tokenizer local (não instalado ou encoding não baixado): ~4 caracteres por token
+            print(f"⚠️ Tokenizer indisponível, usando estimativa por caracteres: {e}")
+            self.encoding = None
+    
+    def count_tokens(self, text: str) -> int:
+        """Conta tokens de um texto"""
+        if self.encoding is None:
+            return (len(text) + 3) // 4
+        return len(self.encoding.encode(text))
+    
+    def trim_to_tokens(self, text: str, max_tokens: int) -> str:
+        """Corta o texto para caber em max_tokens"""
+        if self.encoding is None:
+            return text[:max_tokens * 4]
+        return self.encoding.decode(self.encoding.encode(text)[:max_tokens])
+    
+    def merge_adjacent(self, docs: List[Dict]) -> List[Dict]:
+        """
+        Junta chunks consecutivos do mesmo documento em um único trecho
+        Remove a sobreposição (chunk_overlap) entre eles
+        """
+        by_source: Dict[str, List[Dict]] = {}
+        for doc in docs:
+            by_source.setdefault(doc.get("source", "Unknown"), []).append(doc)
+        
+        merged = []
+        for source, group in by_source.items():
+            group.sort(key=lambda d: d.get("metadata", {}).get("chunk_index", 0))
+            current = None
+            for doc in group:
+                index = doc.get("metadata", {}).get("chunk_index")
+                if current is not None and index is not None and index == current["last_index"] + 1:
+                    current["content"] = self._join_overlapping(current["content"], doc.get("content", ""))
+                    current["similarity"] = max(current["similarity"], doc.get("similarity", 0))
+                    current["last_index"] = index
+                    continue
+                if current is not None:
+                    merged.append(current)
+                current = {
+                    "source": source,
+                    "content": doc.get("content", ""),
+                    "similarity": doc.get("similarity", 0),
+                    "last_index": index if index is not None else -2
+                }
+            if current is not None:
+                merged.append(current)
+        
+        return merged
+    
+    @staticmethod
+    def _join_overlapping(left: str, right: str) -> str:
+        """Concatena dois chunks descartando o trecho repetido no início do segundo"""
+        max_overlap = min(len(left), len(right), settings.chunk_overlap)
+        for size in range(max_overlap, 0, -1):
+            if left.endswith(right[:size]):
+                return left + right[size:]
+        return f"{left}\n{right}"
+    
+    def pack(self, docs: List[Dict], token_budget: Optional[int] = None) -> List[Dict]:
+        """
+        Preenche o orçamento de tokens de forma gulosa, do mais relevante ao menos relevante
+        O último trecho que não couber inteiro é cortado se sobrar espaço útil
+        """
+        budget = token_budget or self.token_budget
+        candidates = sorted(self.merge_adjacent(docs), key=lambda d: d["similarity"], reverse=True)
+        
+        packed = []
+        used = 0
+        for doc in candidates:
+            tokens = self.count_tokens(doc["content"])
+            remaining = budget - used
+            if tokens <= remaining:
+                packed.append(doc)
+                used += tokens
+            elif remaining >= self.min_trim_tokens:
+                packed.append({**doc, "content": self.trim_to_tokens(doc["content"], remaining)})
+                used = budget
+            if used >= budget:
+                break
+        
+        return packed
+
+
+# Instância global (tokenizer carregado no primeiro uso)
+context_packer = LazyService("context_packer", ContextPacker)
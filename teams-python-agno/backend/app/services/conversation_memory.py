@@ -0,0 +1,251 @@
+"""
+Conversation Memory - Histórico multi-turno com resumo incremental
+Últimos N turnos vão literais; turnos antigos são compactados em um resumo
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Set, Tuple
+from sqlalchemy import select, func, update
+from shared.config import settings
+from app import database
+from app.models import Conversation, Message
+from app.adapters.llm_adapter import get_llm_adapter
+from app.services.context_packer import context_packer
+from app.services.history_writer import history_writer
+
+
+SUMMARY_INSTRUCTIONS = (
+    "Você mantém o resumo de uma conversa entre um usuário e um assistente. "
+    "Atualize o resumo existente incorporando as novas mensagens. "
+    "Preserve fatos, decisões, preferências e perguntas em aberto. Seja conciso."
+)
+
+
+class ConversationMemory:
+    """
+    Memória de conversa no banco configurado
+    - SQLite/PostgreSQL: models Conversation/Message (resumo na conversa)
+    - MongoDB: turnos da collection chat_history (gravados pelo router de chat),
+      resumo na collection conversation_memory
+    """
+    
+    def __init__(self):
+        self.max_turns = settings.memory_max_turns
+        self.token_budget = settings.memory_token_budget
+        self._summarizing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+    
+    @property
+    def _mongo(self):
+        """Banco MongoDB quando DATABASE_TYPE=mongodb"""
+        return database.get_database() if database.DATABASE_TYPE == "mongodb" else None
+    
+    @property
+    def available(self) -> bool:
+        """Memória ligada e algum banco conectado (SQL ou MongoDB)"""
+        return settings.memory_enabled and (
+            database.async_session_maker is not None or self._mongo is not None
+        )
+    
+    async def load(self, session_id: str) -> List[Dict[str, str]]:
+        """Retorna resumo + turnos ainda não resumidos dentro do orçamento de tokens"""
+        if not self.available:
+            return []
+        
+        packer = await context_packer.aget()
+        
+        # Inclui os turnos que saíram da janela mas ainda esperam o próximo resumo:
+        # sem eles, a conversa perderia esse trecho até o resumo ser atualizado
+        if self._mongo is not None:
+            summary, pending = await self._load_mongo(session_id)
+        else:
+            summary, pending = await self._load_sql(session_id)
+        
+        budget = self.token_budget
+        messages = []
+        
+        if summary:
+            summary = packer.trim_to_tokens(summary, budget // 3)
+            budget -= packer.count_tokens(summary)
+            messages.append({"role": "system", "content": f"## Resumo da conversa até aqui:\n{summary}"})
+        
+        # Do mais novo para o mais antigo até estourar o orçamento
+        history = []
+        for message in reversed(pending):
+            tokens = packer.count_tokens(message["content"])
+            if tokens > budget:
+                break
+            budget -= tokens
+            history.append(message)
+        
+        messages.extend(reversed(history))
+        return messages
+    
+    async def _load_sql(self, session_id: str) -> Tuple[Optional[str], List[Dict[str, str]]]:
+        async with database.async_read_session_maker() as session:
+            conversation = await session.get(Conversation, session_id)
+            if conversation is None:
+                return None, []
+            
+            result = await session.execute(
+                select(Message.role, Message.content)
+                .where(Message.conversation_id == session_id)
+                .order_by(Message.created_at, Message.id)
+                .offset(conversation.summarized_count or 0)
+            )
+            return conversation.summary, [
+                {"role": role, "content": content} for role, content in result.all()
+            ]
+    
+    async def _load_mongo(self, session_id: str) -> Tuple[Optional[str], List[Dict[str, str]]]:
+        db = self._mongo
+        state = await db.conversation_memory.find_one({"_id": session_id}) or {}
+        turns = await self._mongo_turns(session_id, skip=state.get("summarized_count", 0))
+        return state.get("summary"), turns
+    
+    async def _mongo_turns(self, session_id: str, skip: int, limit: int = 0) -> List[Dict[str, str]]:
+        """Mensagens (usuário/assistente) dos registros de chat_history da sessão, em ordem"""
+        cursor = (
+            self._mongo.chat_history
+            .find({"session_id": session_id}, {"message": 1, "response": 1})
+            .sort([("timestamp", 1), ("_id", 1)])
+            .skip(skip)
+            .limit(limit)
+        )
+        messages = []
+        async for entry in cursor:
+            messages.append({"role": "user", "content": entry["message"]})
+            messages.append({"role": "assistant", "content": entry["response"]})
+        return messages
+    
+    async def append(
+        self,
+        session_id: str,
+        bot_id: str,
+        user_message: str,
+        assistant_message: str
+    ):
+        """Enfileira o turno para gravação e agenda a atualização do resumo em background"""
+        if not self.available:
+            return
+        
+        # MongoDB: o turno já é gravado em chat_history pelo router de chat
+        if self._mongo is None:
+            # Gravação em lote pelo history_writer; timestamps distintos garantem a ordem
+            now = datetime.utcnow()
+            await history_writer.add_message(session_id, bot_id, "user", user_message, now)
+            await history_writer.add_message(
+                session_id, bot_id, "assistant", assistant_message, now + timedelta(microseconds=1)
+            )
+        
+        if session_id not in self._summarizing:
+            task = asyncio.create_task(self._maybe_summarize(session_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _maybe_summarize(self, session_id: str):
+        """Incorpora ao resumo as mensagens que saíram da janela de turnos recentes"""
+        self._summarizing.add(session_id)
+        try:
+            # Espera o history_writer gravar o turno recém-enfileirado
+            await asyncio.sleep(history_writer.flush_interval * 2)
+            
+            if self._mongo is not None:
+                await self._summarize_mongo(session_id)
+            else:
+                await self._summarize_sql(session_id)
+        except Exception as e:
+            print(f"⚠️ Erro ao resumir conversa {session_id}: {e}")
+        finally:
+            self._summarizing.discard(session_id)
+    
+    async def _summarize_sql(self, session_id: str):
+        # A chamada ao LLM fica fora das sessões: o pool de escrita (um único writer no
+        # SQLite) não fica preso enquanto o resumo é gerado
+        async with database.async_read_session_maker() as session:
+            conversation = await session.get(Conversation, session_id)
+            if conversation is None:
+                return
+            summarized = conversation.summarized_count or 0
+            previous_summary = conversation.summary
+            total = await session.scalar(
+                select(func.count()).select_from(Message).where(Message.conversation_id == session_id)
+            )
+            aged = total - self.max_turns * 2 - summarized
+            if aged < settings.memory_summarize_every * 2:
+                return
+            
+            result = await session.execute(
+                select(Message.role, Message.content)
+                .where(Message.conversation_id == session_id)
+                .order_by(Message.created_at, Message.id)
+                .offset(summarized)
+                .limit(aged)
+            )
+            aged_messages = [{"role": role, "content": content} for role, content in result.all()]
+        
+        summary = await self._summarize(previous_summary, aged_messages)
+        
+        async with database.async_session_maker() as session:
+            async with session.begin():
+                # Só grava se ninguém resumiu a conversa nesse meio tempo (outro worker)
+                await session.execute(
+                    update(Conversation)
+                    .where(
+                        Conversation.id == session_id,
+                        func.coalesce(Conversation.summarized_count, 0) == summarized
+                    )
+                    .values(summary=summary, summarized_count=summarized + len(aged_messages))
+                )
+    
+    async def _summarize_mongo(self, session_id: str):
+        # No MongoDB cada registro de chat_history é um turno (pergunta + resposta)
+        db = self._mongo
+        state = await db.conversation_memory.find_one({"_id": session_id}) or {}
+        summarized = state.get("summarized_count", 0)
+        
+        total = await db.chat_history.count_documents({"session_id": session_id})
+        aged = total - self.max_turns - summarized
+        if aged < settings.memory_summarize_every:
+            return
+        
+        aged_messages = await self._mongo_turns(session_id, skip=summarized, limit=aged)
+        summary = await self._summarize(state.get("summary"), aged_messages)
+        await db.conversation_memory.update_one(
+            {"_id": session_id},
+            {"$set": {
+                "summary": summary,
+                "summarized_count": summarized + len(aged_messages) // 2,
+                "updated_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+    
+    async def _summarize(self, previous_summary: Optional[str], messages: List[Dict[str, str]]) -> str:
+        """Atualiza o resumo com novas mensagens"""
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        content = (
+            f"Resumo atual:\n{previous_summary or '(vazio)'}\n\n"
+            f"Novas mensagens:\n{transcript}"
+        )
+        
+        # Mesmo adaptador do chat: Azure, roteamento entre endpoints e coalescência
+        extra = {"model": settings.memory_summary_model} if settings.memory_summary_model else {}
+        response = await get_llm_adapter(settings).chat_completion(
+            [
+                {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+                {"role": "user", "content": content}
+            ],
+            temperature=0.2,
+            max_tokens=settings.memory_summary_max_tokens,
+            **extra
+        )
+        return response["content"]
+
+
+# Instância global
+conversation_memory = ConversationMemory()
@@ -0,0 +1,227 @@
+"""
+History Writer - Persistência do histórico de chat fora do caminho da resposta
+Mensagens ficam em um buffer limitado e são gravadas em lote (insert_many / executemany)
+Cada destino é gravado separadamente, com novas tentativas limitadas antes de descartar
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
+
+import asyncio
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import select, update, insert
+from shared.config import settings
+from app import database
+from app.models import Conversation, Message
+from app.metrics import HISTORY_WRITE_ERRORS, HISTORY_RECORDS
+
+
+# Destinos suportados no buffer
+MONGO_CHAT_HISTORY = "mongo_chat_history"
+SQL_MESSAGES = "sql_messages"
+
+
+class HistoryWriter:
+    """Buffer com flush por tamanho ou tempo e backpressure quando cheio"""
+    
+    def __init__(
+        self,
+        max_buffer: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_retries: Optional[int] = None
+    ):
+        self.max_buffer = max_buffer or settings.history_max_buffer
+        self.batch_size = batch_size or settings.history_batch_size
+        self.flush_interval = flush_interval or settings.history_flush_interval
+        self.max_retries = settings.history_max_retries if max_retries is None else max_retries
+        
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        
+        self.written = 0
+        self.flushes = 0
+        self.errors = 0
+        self.dropped = 0
+    
+    @property
+    def pending(self) -> int:
+        """Registros no buffer aguardando gravação"""
+        return self._queue.qsize() if self._queue is not None else 0
+    
+    async def start(self):
+        """Inicia o loop de flush em background"""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue(maxsize=self.max_buffer)
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Grava tudo o que está no buffer e encerra"""
+        if self._task is None:
+            return
+        
+        await self._queue.put(None)  # Sentinela de encerramento
+        await self._task
+        self._task = None
+        print(f"✅ Histórico gravado ({self.written} registros em {self.flushes} lotes)")
+    
+    async def _put(self, item: Tuple[str, Dict]):
+        if self._task is None or self._task.done():
+            await self.start()
+        # Buffer cheio: o chamador espera (backpressure) em vez de crescer sem limite
+        await self._queue.put(item)
+    
+    async def add_chat_entry(self, entry: Dict):
+        """Enfileira um registro da collection chat_history (MongoDB)"""
+        await self._put((MONGO_CHAT_HISTORY, entry))
+    
+    async def add_message(
+        self,
+        conversation_id: str,
+        bot_id: str,
+        role: str,
+        content: str,
+        created_at: Optional[datetime] = None
+    ):
+        """Enfileira uma linha da tabela messages (SQLite/PostgreSQL)"""
+        await self._put((SQL_MESSAGES, {
+            "conversation_id": conversation_id,
+            "bot_id": bot_id,
+            "role": role,
+            "content": content,
+            "created_at": created_at or datetime.utcnow()
+        }))
+    
+    async def _run(self):
+        """Agrupa itens até batch_size ou flush_interval e grava"""
+        stopping = False
+        while not stopping:
+            batch = []
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch.append(item)
+            
+            deadline = asyncio.get_running_loop().time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            await self._flush(batch)
+    
+    async def _flush(self, batch: List[Tuple[str, Dict]]):
+        """Grava o lote em cada destino com uma única operação em massa"""
+        chat_entries = [payload for sink, payload in batch if sink == MONGO_CHAT_HISTORY]
+        messages = [payload for sink, payload in batch if sink == SQL_MESSAGES]
+        
+        # Destinos independentes e em paralelo: falha (ou novas tentativas) no MongoDB não
+        # descarta nem atrasa as mensagens do SQL, e vice-versa
+        writes = []
+        if chat_entries:
+            writes.append(self._write(MONGO_CHAT_HISTORY, chat_entries, self._flush_chat_entries))
+        if messages:
+            writes.append(self._write(SQL_MESSAGES, messages, self._flush_messages))
+        await asyncio.gather(*writes)
+        self.flushes += 1
+    
+    async def _write(self, sink: str, records: List[Dict], write):
+        """Grava com até max_retries novas tentativas (backoff exponencial) antes de descartar"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                await write(records)
+                self.written += len(records)
+                HISTORY_RECORDS.labels(sink, "written").inc(len(records))
+                return
+            except Exception as e:
+                self.errors += 1
+                HISTORY_WRITE_ERRORS.labels(sink).inc()
+                if attempt == self.max_retries:
+                    self.dropped += len(records)
+                    HISTORY_RECORDS.labels(sink, "dropped").inc(len(records))
+                    print(f"❌ Histórico descartado ({sink}, {len(records)} registros) após {attempt + 1} tentativas: {e}")
+                    return
+                print(f"⚠️ Erro ao gravar histórico ({sink}, {len(records)} registros), tentando de novo: {e}")
+                HISTORY_RECORDS.labels(sink, "retried").inc(len(records))
+                # O loop de flush espera: o buffer enche e os chamadores sentem a backpressure
+                await asyncio.sleep(min(0.5 * 2 ** attempt, 10.0))
+    
+    async def _flush_chat_entries(self, chat_entries: List[Dict]):
+        """insert_many sem ordem; numa nova tentativa, registros já gravados (mesmo _id) são ignorados"""
+        from pymongo.errors import BulkWriteError
+        
+        db = database.get_database()
+        try:
+            await db.chat_history.insert_many(chat_entries, ordered=False)
+        except BulkWriteError as e:
+            # insert_many preenche _id nos dicts: duplicatas aqui são da tentativa anterior
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+    
+    async def _flush_messages(self, messages: List[Dict]):
+        """Cria conversas que faltam e insere as mensagens com executemany"""
+        last_message_at: Dict[str, datetime] = {}
+        bot_ids: Dict[str, str] = {}
+        for message in messages:
+            conversation_id = message["conversation_id"]
+            bot_ids[conversation_id] = message["bot_id"]
+            last_message_at[conversation_id] = max(
+                last_message_at.get(conversation_id, message["created_at"]),
+                message["created_at"]
+            )
+        
+        async with database.async_session_maker() as session:
+            async with session.begin():
+                result = await session.execute(
+                    select(Conversation.id).where(Conversation.id.in_(list(bot_ids)))
+                )
+                existing = set(result.scalars().all())
+                
+                new_conversations = [
+                    {
+                        "id": conversation_id,
+                        "bot_id": bot_id,
+                        "started_at": last_message_at[conversation_id],
+                        "last_message_at": last_message_at[conversation_id]
+                    }
+                    for conversation_id, bot_id in bot_ids.items()
+                    if conversation_id not in existing
+                ]
+                if new_conversations:
+                    await session.execute(insert(Conversation), new_conversations)
+                
+                for conversation_id in existing:
+                    await session.execute(
+                        update(Conversation)
+                        .where(Conversation.id == conversation_id)
+                        .values(last_message_at=last_message_at[conversation_id])
+                    )
+                
+                await session.execute(
+                    insert(Message),
+                    [{k: v for k, v in message.items() if k != "bot_id"} for message in messages]
+                )
+    
+    def stats(self) -> Dict:
+        """Estado do buffer"""
+        return {
+            "buffered": self._queue.qsize() if self._queue else 0,
+            "max_buffer": self.max_buffer,
+            "written": self.written,
+            "flushes": self.flushes,
+            "errors": self.errors,
+            "dropped": self.dropped
+        }
+
+
+# Instância global
+history_writer = HistoryWriter()
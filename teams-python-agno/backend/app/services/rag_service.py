@@ -5,25 +5,79 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
 
-from typing import List, Dict
+import asyncio
+import os
+import time
+from typing import List, Dict, Optional, Tuple, Callable, Awaitable
 import aiofiles
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-from langchain_openai import OpenAIEmbeddings
-from docx import Document
+import numpy as np
 from shared.config import settings, UPLOADS_DIR
-from .chromadb_service import chroma_service
+from app.adapters.llm_adapter import get_llm_adapter
+from app.dependencies import LazyService
+from .vector_service import vector_service
+from .context_packer import context_packer
+
+
+def distance_to_similarity(distance: float, space: str = "l2") -> float:
+    """
+    Normaliza a distância retornada pelo vector store para similaridade em [0, 1]
+    Permite comparar resultados de collections com métricas diferentes
+    """
+    if space == "l2":
+        # Distância L2 ao quadrado entre vetores unitários varia de 0 a 4
+        similarity = 1 - distance / 2
+    else:
+        # cosine e ip: distância = 1 - produto interno
+        similarity = 1 - distance
+    
+    return max(0.0, min(1.0, similarity))
+
+
+def maximal_marginal_relevance(
+    query_embedding: List[float],
+    candidate_embeddings: List[List[float]],
+    k: int,
+    lambda_mult: float = 0.7
+) -> List[int]:
+    """
+    Seleciona k candidatos equilibrando relevância e diversidade (MMR)
+    Retorna os índices escolhidos, na ordem de seleção
+    """
+    if not candidate_embeddings or k <= 0:
+        return []
+    
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    
+    # Similaridade de cosseno via produto interno de vetores normalizados
+    candidates /= np.linalg.norm(candidates, axis=1, keepdims=True) + 1e-10
+    query /= np.linalg.norm(query) + 1e-10
+    
+    relevance = candidates @ query
+    pairwise = candidates @ candidates.T
+    
+    selected = [int(np.argmax(relevance))]
+    max_similarity = pairwise[selected[0]].copy()
+    
+    while len(selected) < min(k, len(candidates)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[selected] = -np.inf
+        next_index = int(np.argmax(scores))
+        selected.append(next_index)
+        max_similarity = np.maximum(max_similarity, pairwise[next_index])
+    
+    return selected
 
 
 class RAGService:
     """Serviço de RAG (Retrieval Augmented Generation)"""
     
     def __init__(self):
-        # OpenAI Embeddings
-        self.embeddings = OpenAIEmbeddings(
-            openai_api_key=settings.openai_api_key,
-            model=settings.embedding_model
-        )
+        # Import tardio: LangChain só é carregado quando o serviço é criado
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        
+        # Embeddings pelo adaptador LLM (OpenAI ou Azure, roteamento e micro-batching de queries)
+        self.llm = get_llm_adapter(settings)
         
         # Text Splitter
         self.text_splitter = RecursiveCharacterTextSplitter(
@@ -36,27 +90,36 @@ class RAGService:
     
     async def extract_text(self, file_path: str, content_type: str) -> str:
         """Extrai texto de diferentes tipos de arquivo"""
+        text, _ = await self.extract_text_with_pages(file_path, content_type)
+        return text
+    
+    async def extract_text_with_pages(self, file_path: str, content_type: str) -> Tuple[str, Optional[int]]:
+        """Extrai texto e número de páginas (None para formatos sem paginação)"""
         
         if content_type == "application/pdf":
             return await self._extract_from_pdf(file_path)
         
         elif content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            return await self._extract_from_docx(file_path)
+            return await self._extract_from_docx(file_path), None
         
         elif content_type in ["text/plain", "text/markdown"]:
-            return await self._extract_from_text(file_path)
+            return await self._extract_from_text(file_path), None
         
         else:
             raise ValueError(f"Tipo de arquivo não suportado: {content_type}")
     
-    async def _extract_from_pdf(self, file_path: str) -> str:
+    async def _extract_from_pdf(self, file_path: str) -> Tuple[str, int]:
         """Extrai texto de PDF"""
+        from langchain_community.document_loaders import PyPDFLoader
+        
         loader = PyPDFLoader(file_path)
         pages = loader.load()
-        return "\n\n".join([page.page_content for page in pages])
+        return "\n\n".join([page.page_content for page in pages]), len(pages)
     
     async def _extract_from_docx(self, file_path: str) -> str:
         """Extrai texto de DOCX"""
+        from docx import Document
+        
         doc = Document(file_path)
         return "\n\n".join([paragraph.text for paragraph in doc.paragraphs])
     
@@ -70,21 +133,49 @@ class RAGService:
         bot_id: str,
         file_path: str,
         filename: str,
-        content_type: str
-    ) -> int:
-        """Processa documento completo: extrai texto, divide em chunks, gera embeddings"""
+        content_type: str,
+        on_stage: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> Dict:
+        """
+        Processa documento completo: extrai texto, divide em chunks, gera embeddings
+        Retorna as estatísticas da ingestão (bytes, páginas, chunks, tokens e tempo por etapa em ms)
+        on_stage é chamado no início de cada etapa para reportar progresso
+        """
+        timings = {}
+        started = time.perf_counter()
+        
+        async def _enter(stage: str) -> float:
+            if on_stage:
+                await on_stage(stage)
+            return time.perf_counter()
+        
+        def _elapsed_ms(stage_start: float) -> float:
+            return round((time.perf_counter() - stage_start) * 1000, 2)
         
         # 1. Extrai texto
-        text = await self.extract_text(file_path, content_type)
+        stage_start = await _enter("extract")
+        text, pages = await self.extract_text_with_pages(file_path, content_type)
+        timings["extract"] = _elapsed_ms(stage_start)
         
         if not text.strip():
             raise ValueError("Documento vazio ou não foi possível extrair texto")
         
         # 2. Divide em chunks
+        stage_start = await _enter("split")
         chunks = self.text_splitter.split_text(text)
+        timings["split"] = _elapsed_ms(stage_start)
+        
+        # Tokens contados em thread enquanto os embeddings são gerados (tiktoken em todos os
+        # chunks travaria o event loop em documentos grandes)
+        packer = await context_packer.aget()
+        tokens_task = asyncio.create_task(
+            asyncio.to_thread(lambda: sum(packer.count_tokens(chunk) for chunk in chunks))
+        )
         
         # 3. Gera embeddings (batch)
+        stage_start = await _enter("embed")
         embeddings = await self._generate_embeddings_batch(chunks)
+        timings["embed"] = _elapsed_ms(stage_start)
         
         # 4. Prepara metadatas
         metadatas = [
@@ -97,48 +188,79 @@ class RAGService:
             for i in range(len(chunks))
         ]
         
-        # 5. Adiciona ao ChromaDB
-        count = await chroma_service.add_documents(
+        # 5. Adiciona ao vector store
+        stage_start = await _enter("upsert")
+        store = await vector_service.aget()
+        count = await store.add_documents(
             bot_id=bot_id,
             chunks=chunks,
             embeddings=embeddings,
             metadatas=metadatas
         )
+        timings["upsert"] = _elapsed_ms(stage_start)
+        timings["total"] = _elapsed_ms(started)
         
-        return count
+        return {
+            "bytes": os.path.getsize(file_path),
+            "pages": pages,
+            "chunks": count,
+            # Tokens enviados ao modelo de embedding (inclui overlap entre chunks)
+            "tokens": await tokens_task,
+            "timings_ms": timings
+        }
     
     async def _generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
         """Gera embeddings em batch para melhor performance"""
         # OpenAI permite até 2048 textos por request
         batch_size = 100
-        all_embeddings = []
+        semaphore = asyncio.Semaphore(settings.embedding_max_concurrency)
+        
+        async def _embed_batch(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self.llm.generate_embeddings_batch(batch)
         
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            batch_embeddings = self.embeddings.embed_documents(batch)
-            all_embeddings.extend(batch_embeddings)
+        # Batches em paralelo; gather preserva a ordem dos chunks
+        batches = await asyncio.gather(*(
+            _embed_batch(texts[i:i + batch_size])
+            for i in range(0, len(texts), batch_size)
+        ))
         
-        return all_embeddings
+        return [embedding for batch in batches for embedding in batch]
+    
+    async def embed_query(self, query: str) -> List[float]:
+        """Gera embedding de uma query"""
+        return await self.llm.generate_embedding(query)
     
     async def search_relevant_documents(
         self,
         bot_id: str,
         query: str,
-        max_results: int = None
+        max_results: int = None,
+        diversify: Optional[bool] = None,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict]:
-        """Busca documentos relevantes para uma query"""
+        """
+        Busca documentos relevantes para uma query
+        Com diversify, busca um pool maior e re-ranqueia por MMR para evitar chunks quase idênticos
+        """
         
         if max_results is None:
             max_results = settings.max_chunks_per_query
+        if diversify is None:
+            diversify = settings.enable_mmr
         
-        # 1. Gera embedding da query
-        query_embedding = self.embeddings.embed_query(query)
+        # 1. Gera embedding da query (se ainda não foi calculado)
+        if query_embedding is None:
+            query_embedding = await self.embed_query(query)
         
-        # 2. Busca no ChromaDB
-        results = await chroma_service.search_similar(
+        # 2. Busca no vector store (pool maior de candidatos se for re-ranquear)
+        n_candidates = max(settings.mmr_fetch_k, max_results) if diversify else max_results
+        store = await vector_service.aget()
+        results = await store.search_similar(
             bot_id=bot_id,
             query_embedding=query_embedding,
-            n_results=max_results
+            n_results=n_candidates,
+            include_embeddings=diversify
         )
         
         # 3. Formata resultados
@@ -155,8 +277,99 @@ class RAGService:
                     "source": metadata.get("filename", "Unknown")
                 })
         
-        return documents
+        # 4. Re-ranking por diversidade (MMR) sobre os candidatos
+        if diversify and results.get("embeddings") and len(documents) > max_results:
+            selected = maximal_marginal_relevance(
+                query_embedding,
+                results["embeddings"][0],
+                k=max_results,
+                lambda_mult=settings.mmr_lambda
+            )
+            documents = [documents[i] for i in selected]
+        
+        return documents[:max_results]
+    
+    async def search_federated(
+        self,
+        bot_ids: List[str],
+        query: str,
+        max_results: Optional[int] = None,
+        timeout: Optional[float] = None
+    ) -> Dict:
+        """
+        Busca em várias collections de bots em paralelo, com um prazo único para o fan-out
+        Collections que não terminam no prazo ou com erro são ignoradas e o resultado é parcial
+        """
+        
+        if max_results is None:
+            max_results = settings.max_chunks_per_query
+        if timeout is None:
+            timeout = settings.federated_search_timeout
+        
+        # 1. Gera embedding da query uma única vez para todas as collections
+        query_embedding = await self.embed_query(query)
+        
+        # 2. Fan-out com limite de concorrência; o prazo vale para o conjunto (inclui a espera
+        #    no semáforo), então a latência total fica limitada a timeout
+        store = await vector_service.aget()
+        semaphore = asyncio.Semaphore(settings.federated_max_concurrency)
+        
+        async def _search_collection(bot_id: str) -> List[Dict]:
+            async with semaphore:
+                results, space = await store.search_with_space(
+                    bot_id=bot_id,
+                    query_embedding=query_embedding,
+                    n_results=max_results
+                )
+            
+            documents = []
+            if results and results.get("documents"):
+                metadatas = results.get("metadatas") or [[]]
+                distances = results.get("distances") or [[]]
+                for i, doc in enumerate(results["documents"][0]):
+                    metadata = metadatas[0][i] if i < len(metadatas[0]) else {}
+                    distance = distances[0][i] if i < len(distances[0]) else 0
+                    documents.append({
+                        "bot_id": bot_id,
+                        "content": doc,
+                        "metadata": metadata,
+                        "similarity": distance_to_similarity(distance, space),
+                        "source": metadata.get("filename", "Unknown")
+                    })
+            return documents
+        
+        tasks = {asyncio.create_task(_search_collection(bot_id)): bot_id for bot_id in bot_ids}
+        pending = set()
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        
+        # 3. Junta resultados e separa collections que falharam ou estouraram o prazo
+        documents = []
+        timed_out = []
+        failed = []
+        for task, bot_id in tasks.items():
+            if task in pending:
+                timed_out.append(bot_id)
+            elif task.exception() is not None:
+                failed.append(bot_id)
+                print(f"⚠️ Erro na busca federada do bot {bot_id}: {task.exception()}")
+            else:
+                documents.extend(task.result())
+        
+        # 4. Top-k global pela similaridade normalizada
+        documents.sort(key=lambda x: x["similarity"], reverse=True)
+        
+        return {
+            "results": documents[:max_results],
+            "searched": len(bot_ids),
+            "timed_out": timed_out,
+            "failed": failed,
+            "partial": bool(timed_out or failed)
+        }
 
 
-# Instância global
-rag_service = RAGService()
+# Instância global (criada no primeiro uso)
+rag_service = LazyService("rag", RAGService)
@@ -0,0 +1,165 @@
+"""
+Semantic Response Cache - Reaproveita respostas para perguntas parecidas
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import List, Dict, Optional
+import numpy as np
+from shared.config import settings
+from app.adapters.change_feed import change_feed
+
+
+class SemanticResponseCache:
+    """
+    Cache de respostas por bot, indexado pelo embedding da pergunta
+    Uma entrada só é válida para as mesmas instruções e o mesmo conjunto de documentos
+    """
+    
+    CHANGE_TOPIC = "response_cache"
+    
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None
+    ):
+        self.threshold = threshold or settings.semantic_cache_threshold
+        self.max_entries = max_entries or settings.semantic_cache_max_entries
+        self.ttl = ttl or settings.semantic_cache_ttl
+        
+        # bot_id -> OrderedDict[chave, entrada] (ordem LRU)
+        self._entries: Dict[str, OrderedDict] = {}
+        # bot_id -> (chaves, matriz de embeddings normalizados)
+        self._matrices: Dict[str, tuple] = {}
+        # bot_id -> versão do conjunto de documentos
+        self._doc_versions: Dict[str, int] = {}
+        
+        # Documentos enviados/removidos em outro worker também invalidam este
+        change_feed.subscribe(self.CHANGE_TOPIC, self._on_change)
+        
+        self.hits = 0
+        self.misses = 0
+    
+    def _on_change(self, bot_id: Optional[str], event: Dict):
+        if bot_id is None:
+            for bot_id in list(self._entries):
+                self._drop(bot_id)
+        else:
+            self._drop(bot_id)
+    
+    @staticmethod
+    def _instructions_hash(bot_instructions: str) -> str:
+        return hashlib.sha256(bot_instructions.encode("utf-8")).hexdigest()
+    
+    def _matrix(self, bot_id: str):
+        """Matriz de embeddings do bot, reconstruída apenas quando o cache muda"""
+        if bot_id not in self._matrices:
+            entries = self._entries.get(bot_id) or {}
+            keys = list(entries.keys())
+            matrix = np.stack([entries[k]["embedding"] for k in keys]) if keys else None
+            self._matrices[bot_id] = (keys, matrix)
+        return self._matrices[bot_id]
+    
+    def get(
+        self,
+        bot_id: str,
+        bot_instructions: str,
+        query_embedding: List[float]
+    ) -> Optional[Dict]:
+        """Retorna a resposta válida mais parecida acima do threshold"""
+        keys, matrix = self._matrix(bot_id)
+        if matrix is None:
+            self.misses += 1
+            return None
+        
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) + 1e-10
+        
+        # Entradas de outras instruções, de outro conjunto de documentos ou expiradas ficam
+        # fora antes da escolha: uma vizinha inválida não pode esconder uma válida logo abaixo
+        entries = self._entries[bot_id]
+        instructions_hash = self._instructions_hash(bot_instructions)
+        doc_version = self.doc_version(bot_id)
+        now = time.monotonic()
+        valid = np.array([
+            entries[key]["instructions_hash"] == instructions_hash
+            and entries[key]["doc_version"] == doc_version
+            and now - entries[key]["created_at"] <= self.ttl
+            for key in keys
+        ])
+        
+        similarities = np.where(valid, matrix @ query, -np.inf)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self.misses += 1
+            return None
+        
+        entries.move_to_end(keys[best])
+        self.hits += 1
+        return entries[keys[best]]["result"]
+    
+    def doc_version(self, bot_id: str) -> int:
+        """Versão atual do conjunto de documentos do bot (capturar antes da busca de contexto)"""
+        return self._doc_versions.get(bot_id, 0)
+    
+    def set(
+        self,
+        bot_id: str,
+        bot_instructions: str,
+        query: str,
+        query_embedding: List[float],
+        result: Dict,
+        doc_version: Optional[int] = None
+    ):
+        """
+        Armazena a resposta de uma pergunta
+        doc_version: versão lida antes da busca de contexto; se um upload terminar durante
+        a chamada ao LLM, a resposta fica marcada com a versão antiga e nunca é servida
+        """
+        embedding = np.asarray(query_embedding, dtype=np.float32)
+        embedding /= np.linalg.norm(embedding) + 1e-10
+        
+        entries = self._entries.setdefault(bot_id, OrderedDict())
+        entries[query] = {
+            "embedding": embedding,
+            "result": result,
+            "instructions_hash": self._instructions_hash(bot_instructions),
+            "doc_version": self.doc_version(bot_id) if doc_version is None else doc_version,
+            "created_at": time.monotonic()
+        }
+        entries.move_to_end(query)
+        
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        
+        self._matrices.pop(bot_id, None)
+    
+    def _drop(self, bot_id: str):
+        self._doc_versions[bot_id] = self._doc_versions.get(bot_id, 0) + 1
+        self._entries.pop(bot_id, None)
+        self._matrices.pop(bot_id, None)
+    
+    async def invalidate_bot(self, bot_id: str):
+        """Descarta as respostas de um bot (documentos enviados ou removidos) em todos os workers"""
+        self._drop(bot_id)
+        await change_feed.publish(self.CHANGE_TOPIC, bot_id)
+    
+    def stats(self) -> Dict:
+        """Estatísticas de uso do cache"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "bots": len(self._entries),
+            "entries": sum(len(e) for e in self._entries.values())
+        }
+
+
+# Instância global
+response_cache = SemanticResponseCache()
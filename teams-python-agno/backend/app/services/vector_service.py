@@ -0,0 +1,86 @@
+"""
+Vector Service - Vector store usado pelo RAG (ingestão, busca e remoção por bot)
+VECTOR_STORE=chromadb usa o ChromaDBService (um único processo); faiss e qdrant passam
+pelo adaptador de vector store, que suporta vários workers (FAISS compartilhado via mmap)
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
+
+from typing import List, Dict, Tuple
+from shared.config import settings
+from app.dependencies import LazyService
+
+
+class AdapterVectorService:
+    """Interface do ChromaDBService sobre um adaptador de vector store (uma collection por bot)"""
+    
+    def __init__(self, adapter, store: str):
+        self.adapter = adapter
+        self.store = store
+        print(f"✅ Vector store do RAG: {store}")
+    
+    @staticmethod
+    def _collection(bot_id: str) -> str:
+        return f"bot_{bot_id}"
+    
+    async def add_documents(
+        self,
+        bot_id: str,
+        chunks: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict]
+    ) -> int:
+        """Adiciona documentos à collection do bot"""
+        return await self.adapter.add_documents(self._collection(bot_id), chunks, embeddings, metadatas)
+    
+    async def search_similar(
+        self,
+        bot_id: str,
+        query_embedding: List[float],
+        n_results: int = 5,
+        include_embeddings: bool = False
+    ) -> Dict:
+        """Busca documentos similares (os adaptadores não retornam embeddings: sem re-ranking MMR)"""
+        results, _ = await self.search_with_space(bot_id, query_embedding, n_results)
+        return results
+    
+    async def search_with_space(
+        self,
+        bot_id: str,
+        query_embedding: List[float],
+        n_results: int = 5,
+        include_embeddings: bool = False
+    ) -> Tuple[Dict, str]:
+        """Busca documentos similares e retorna também a métrica de distância"""
+        results = await self.adapter.search_similar(self._collection(bot_id), query_embedding, n_results)
+        
+        if self.store == "qdrant":
+            # Qdrant devolve similaridade de cosseno; convertida em distância como no Chroma
+            results["distances"] = [[1 - score for score in row] for row in results.get("distances") or [[]]]
+            return results, "cosine"
+        
+        # FAISS: distância L2 ao quadrado (IndexFlatL2)
+        return results, "l2"
+    
+    async def delete_bot_documents(self, bot_id: str):
+        """Deleta todos documentos de um bot"""
+        await self.adapter.delete_collection(self._collection(bot_id))
+    
+    async def get_collection_count(self, bot_id: str) -> int:
+        """Retorna número de documentos na collection"""
+        return await self.adapter.get_collection_count(self._collection(bot_id))
+
+
+def create_vector_service():
+    """ChromaDBService ou o adaptador configurado em VECTOR_STORE"""
+    if settings.vector_store == "chromadb":
+        from app.services.chromadb_service import ChromaDBService
+        return ChromaDBService()
+    
+    from app.adapters.vector_store_adapter import get_vector_store_adapter
+    return AdapterVectorService(get_vector_store_adapter(settings), settings.vector_store)
+
+
+# Instância global (criada no primeiro uso)
+vector_service = LazyService("vector_store", create_vector_service)
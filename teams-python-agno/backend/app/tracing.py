@@ -0,0 +1,221 @@
+"""
+Tracing - Instrumentação AgentOps com amostragem e exportação assíncrona
+Spans vão para uma fila limitada e são exportados em lote por uma task em background;
+com a fila cheia o span é descartado em vez de atrasar a requisição
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import asyncio
+import functools
+import random
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from shared.config import settings
+from app.metrics import TRACING_OVERHEAD_SECONDS, TRACING_SPANS, TRACING_QUEUE
+
+
+# Modos suportados
+TRACING_AGENTOPS = "agentops"
+TRACING_NOOP = "noop"
+
+# Limite de caracteres por parâmetro/retorno enviado ao AgentOps
+MAX_FIELD_LENGTH = 500
+
+
+def _iso(timestamp: float) -> str:
+    """Timestamp no formato usado pelo AgentOps"""
+    return datetime.utcfromtimestamp(timestamp).isoformat(timespec="milliseconds") + "Z"
+
+
+def _truncate(value: Any) -> str:
+    text = value if isinstance(value, str) else repr(value)
+    return text if len(text) <= MAX_FIELD_LENGTH else text[:MAX_FIELD_LENGTH] + "..."
+
+
+class Tracer:
+    """Envia ações ao AgentOps fora do caminho da requisição"""
+    
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        sample_rate: Optional[float] = None,
+        queue_size: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None
+    ):
+        self.mode = mode or settings.tracing_mode
+        self.sample_rate = settings.tracing_sample_rate if sample_rate is None else sample_rate
+        self.queue_size = queue_size or settings.tracing_queue_size
+        self.batch_size = batch_size or settings.tracing_batch_size
+        self.flush_interval = flush_interval or settings.tracing_flush_interval
+        
+        self.active = False
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        
+        TRACING_QUEUE.set_function(lambda: self._queue.qsize() if self._queue is not None else 0)
+    
+    @property
+    def enabled(self) -> bool:
+        return self.mode != TRACING_NOOP
+    
+    async def start(self):
+        """Inicializa o AgentOps (fora do import) e a task de exportação"""
+        if not self.enabled or self.active:
+            return
+        
+        try:
+            # Import tardio: agentops só é carregado com o tracing ativo
+            import agentops
+            
+            # init abre a sessão via HTTP: roda em thread para não bloquear o event loop
+            await asyncio.to_thread(
+                agentops.init,
+                api_key=settings.agentops_api_key,
+                tags=["teams-bot", "production"],
+                instrument_llm_calls=settings.tracing_instrument_llm
+            )
+        except Exception as e:
+            print(f"⚠️ AgentOps indisponível, tracing desativado: {e}")
+            self.mode = TRACING_NOOP
+            return
+        
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+        self.active = True
+        print(f"✅ Tracing AgentOps ativo (amostragem {self.sample_rate:.0%})")
+    
+    async def stop(self):
+        """Exporta o que está na fila e encerra a sessão AgentOps"""
+        if self._task is None:
+            return
+        
+        await self._queue.put(None)  # Sentinela de encerramento
+        await self._task
+        self._task = None
+        
+        import agentops
+        await asyncio.to_thread(agentops.end_session, "Success")
+        self.active = False
+    
+    def record_action(self, action_type: str):
+        """
+        Decorator para métodos async: registra a chamada como ActionEvent
+        Chamadas com erro são sempre registradas; as demais seguem a taxa de amostragem
+        """
+        def decorator(func: Callable[..., Awaitable[Any]]):
+            # Modo noop: a função original, sem nenhum custo
+            if not self.enabled:
+                return func
+            
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not self.active:
+                    return await func(*args, **kwargs)
+                
+                started = time.time()
+                error = None
+                result = None
+                try:
+                    result = await func(*args, **kwargs)
+                    return result
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    overhead_start = time.perf_counter()
+                    if error is not None or random.random() < self.sample_rate:
+                        # args[0] é o self do método decorado
+                        self._submit({
+                            "action_type": action_type,
+                            "params": kwargs or dict(enumerate(args[1:])),
+                            "returns": result,
+                            "error": error,
+                            "started": started,
+                            "ended": time.time()
+                        })
+                    else:
+                        TRACING_SPANS.labels("unsampled").inc()
+                    TRACING_OVERHEAD_SECONDS.observe(time.perf_counter() - overhead_start)
+            
+            return wrapper
+        
+        return decorator
+    
+    def _submit(self, span: Dict):
+        """Enfileira sem esperar; fila cheia descarta o span"""
+        try:
+            self._queue.put_nowait(span)
+            TRACING_SPANS.labels("queued").inc()
+        except asyncio.QueueFull:
+            TRACING_SPANS.labels("dropped").inc()
+    
+    async def _run(self):
+        """Exporta em lote por tamanho ou intervalo"""
+        while True:
+            span = await self._queue.get()
+            if span is None:
+                return
+            
+            batch = [span]
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+            
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    span = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if span is None:
+                    stopping = True
+                    break
+                batch.append(span)
+            
+            await self._export(batch)
+            if stopping:
+                return
+    
+    async def _export(self, batch: List[Dict]):
+        """Converte e entrega os spans ao AgentOps em uma thread"""
+        try:
+            await asyncio.to_thread(self._record_batch, batch)
+            TRACING_SPANS.labels("exported").inc(len(batch))
+        except Exception as e:
+            TRACING_SPANS.labels("failed").inc(len(batch))
+            print(f"⚠️ Erro ao exportar spans do AgentOps: {e}")
+    
+    def _record_batch(self, batch: List[Dict]):
+        import agentops
+        from agentops import ActionEvent, ErrorEvent
+        
+        for span in batch:
+            event = ActionEvent(
+                action_type=span["action_type"],
+                params={str(key): _truncate(value) for key, value in span["params"].items()},
+                returns=_truncate(span["returns"]) if span["returns"] is not None else None,
+                init_timestamp=_iso(span["started"]),
+                end_timestamp=_iso(span["ended"])
+            )
+            agentops.record(event)
+            
+            if span["error"] is not None:
+                agentops.record(ErrorEvent(trigger_event=event, exception=span["error"], logs=None))
+    
+    def stats(self) -> Dict:
+        """Estado do tracing"""
+        return {
+            "mode": self.mode,
+            "active": self.active,
+            "sample_rate": self.sample_rate,
+            "pending": self._queue.qsize() if self._queue is not None else 0
+        }
+
+
+# Instância global
+tracer = Tracer()
@@ -0,0 +1,102 @@
+"""
+Benchmark: tempo de import da API (cold start de um worker)
+Importa app.main em um interpretador novo, mede o melhor de N execuções e falha
+(exit code 1) se passar do orçamento ou se algum módulo pesado for carregado no import
+
+Uso (a partir de backend/):
+    python -m benchmarks.import_time_bench --budget-ms 1200
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import argparse
+import json
+import os
+import subprocess
+from typing import Dict, List, Tuple
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Carregados só no primeiro uso / warm-up (app.dependencies)
+DEFERRED_MODULES = ["chromadb", "langchain", "langchain_openai", "langchain_community", "openai", "agentops", "tiktoken", "docx"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({"ms": elapsed * 1000, "loaded": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def measure_once() -> Dict:
+    """Import em um processo novo (sem cache de módulos do processo atual)"""
+    env = {"OPENAI_API_KEY": "sk-bench", "AGENTOPS_API_KEY": "bench", **os.environ}
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE % DEFERRED_MODULES],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    # A última linha é o JSON; as anteriores são prints de inicialização
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def top_imports(limit: int) -> List[Tuple[int, str]]:
+    """Módulos com maior tempo cumulativo de import (-X importtime)"""
+    env = {"OPENAI_API_KEY": "sk-bench", "AGENTOPS_API_KEY": "bench", **os.environ}
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True
+    ).stderr
+
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=1200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [measure_once() for _ in range(args.repeat)]
+    best_ms = min(run["ms"] for run in runs)
+    loaded = sorted({module for run in runs for module in run["loaded"]})
+
+    print(f"import app.main (melhor de {args.repeat}): {best_ms:.0f} ms (orçamento {args.budget_ms:.0f} ms)")
+    print("Maiores imports (cumulativo):")
+    for cumulative_us, name in top_imports(args.top):
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failures = []
+    if best_ms > args.budget_ms:
+        failures.append(f"import acima do orçamento: {best_ms:.0f} ms > {args.budget_ms:.0f} ms")
+    if loaded:
+        failures.append(f"módulos pesados carregados no import: {', '.join(loaded)}")
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+
+    print("✅ Dentro do orçamento")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark: serialização da listagem de documentos
+Compara DocumentResponse por linha + validação/encode do FastAPI com o caminho orjson em streaming
+
+Uso (a partir de backend/):
+    python -m benchmarks.serialization_bench --rows 10000
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import List
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from app.models import DocumentResponse
+from app.serialization import iter_json_array
+
+
+def make_rows(n: int) -> List[dict]:
+    """Documentos como o MongoDB devolve (com _id) e como a projeção devolve (com id)"""
+    now = datetime.utcnow()
+    raw = [
+        {
+            "_id": ObjectId(),
+            "bot_id": "65a1f0c2e4b0a1b2c3d4e5f6",
+            "filename": f"manual_{i}.pdf",
+            "content_type": "application/pdf",
+            "file_size": 1024 * (i % 500 + 1),
+            "status": "completed",
+            "chunk_count": i % 40,
+            "created_at": now,
+        }
+        for i in range(n)
+    ]
+    projected = [{"id": str(row.pop("_id")), **row} for row in (dict(r) for r in raw)]
+    return raw, projected
+
+
+def legacy(raw: List[dict]) -> bytes:
+    """Caminho antigo: modelo por linha, revalidação do response_model e json.dumps"""
+    documents = [
+        DocumentResponse(
+            id=str(doc["_id"]),
+            bot_id=doc["bot_id"],
+            filename=doc["filename"],
+            content_type=doc["content_type"],
+            file_size=doc["file_size"],
+            status=doc["status"],
+            chunk_count=doc["chunk_count"],
+            created_at=doc["created_at"]
+        )
+        for doc in raw
+    ]
+    validated = TypeAdapter(List[DocumentResponse]).validate_python(
+        [d.model_dump() for d in documents]
+    )
+    return json.dumps(jsonable_encoder(validated)).encode("utf-8")
+
+
+async def fast(projected: List[dict]) -> bytes:
+    """Caminho novo: linhas projetadas direto para orjson em blocos"""
+    async def rows():
+        for row in projected:
+            yield row
+    
+    return b"".join([chunk async for chunk in iter_json_array(rows())])
+
+
+def timed(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    
+    raw, projected = make_rows(args.rows)
+    
+    legacy_ms = timed(lambda: legacy(raw), args.repeat)
+    fast_ms = timed(lambda: asyncio.run(fast(projected)), args.repeat)
+    
+    print(f"{args.rows} documentos (melhor de {args.repeat})")
+    print(f"  legacy (Pydantic + jsonable_encoder): {legacy_ms:8.1f} ms")
+    print(f"  orjson streaming:                     {fast_ms:8.1f} ms ({legacy_ms / fast_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
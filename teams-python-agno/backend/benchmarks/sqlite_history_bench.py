@@ -0,0 +1,114 @@
+"""
+Benchmark: gravação e leitura concorrentes de histórico de chat no SQLite
+Compara o perfil legacy (StaticPool) com o perfil tuned (WAL + pool de leitura + escritor único)
+
+Uso (a partir de backend/):
+    python -m benchmarks.sqlite_history_bench --writers 8 --readers 16 --turns 200
+"""
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+import argparse
+import asyncio
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.database import Base, build_sqlite_engines
+from app.models import Conversation, Message
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] * 1000
+
+
+async def run_profile(profile: str, writers: int, readers: int, turns: int) -> dict:
+    """Cada escritor grava `turns` turnos e cada leitor lê `turns` páginas, todos ao mesmo tempo"""
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{tmp}/bench.db"
+        write_engine, read_engine = build_sqlite_engines(url, profile=profile)
+        write_sessions = async_sessionmaker(write_engine, class_=AsyncSession, expire_on_commit=False)
+        read_sessions = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+        
+        async with write_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        
+        conversation_ids = [str(uuid.uuid4()) for _ in range(writers)]
+        async with write_sessions() as session, session.begin():
+            await session.execute(insert(Conversation), [
+                {"id": cid, "bot_id": "bench"} for cid in conversation_ids
+            ])
+        
+        write_latencies, read_latencies = [], []
+        
+        async def writer(conversation_id: str):
+            for i in range(turns):
+                start = time.perf_counter()
+                async with write_sessions() as session, session.begin():
+                    now = datetime.utcnow()
+                    await session.execute(insert(Message), [
+                        {"conversation_id": conversation_id, "role": "user", "content": f"pergunta {i}", "created_at": now},
+                        {"conversation_id": conversation_id, "role": "assistant", "content": f"resposta {i}" * 20, "created_at": now},
+                    ])
+                write_latencies.append(time.perf_counter() - start)
+        
+        async def reader(n: int):
+            conversation_id = conversation_ids[n % len(conversation_ids)]
+            for _ in range(turns):
+                start = time.perf_counter()
+                async with read_sessions() as session:
+                    result = await session.execute(
+                        select(Message)
+                        .where(Message.conversation_id == conversation_id)
+                        .order_by(Message.created_at.desc(), Message.id.desc())
+                        .limit(20)
+                    )
+                    result.scalars().all()
+                read_latencies.append(time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(writer(cid) for cid in conversation_ids),
+            *(reader(n) for n in range(readers))
+        )
+        elapsed = time.perf_counter() - start
+        
+        await write_engine.dispose()
+        if read_engine is not write_engine:
+            await read_engine.dispose()
+        
+        return {
+            "profile": profile,
+            "elapsed_s": elapsed,
+            "writes_per_s": len(write_latencies) / elapsed,
+            "reads_per_s": len(read_latencies) / elapsed,
+            "write_p50_ms": _percentile(write_latencies, 0.50),
+            "write_p95_ms": _percentile(write_latencies, 0.95),
+            "read_p50_ms": _percentile(read_latencies, 0.50) if read_latencies else 0.0,
+            "read_p95_ms": _percentile(read_latencies, 0.95) if read_latencies else 0.0,
+        }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+    
+    for profile in ("legacy", "tuned"):
+        result = await run_profile(profile, args.writers, args.readers, args.turns)
+        print(
+            f"{result['profile']:>7} | {result['elapsed_s']:6.2f} s | "
+            f"writes/s {result['writes_per_s']:8.1f} (p50 {result['write_p50_ms']:.2f} ms, p95 {result['write_p95_ms']:.2f} ms) | "
+            f"reads/s {result['reads_per_s']:8.1f} (p50 {result['read_p50_ms']:.2f} ms, p95 {result['read_p95_ms']:.2f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
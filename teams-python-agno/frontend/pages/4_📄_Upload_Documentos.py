@@ -4,6 +4,7 @@ Upload de Documentos - Gerenciamento de documentos para RAG
 import streamlit as st
 import requests
 import os
+import time
 from datetime import datetime
 
 # Configuração da página
@@ -16,6 +17,10 @@ st.set_page_config(
 # API URL
 API_URL = os.getenv("API_URL", "http://localhost:8000")
 
+# Acompanhamento do upload em lote (GET /documents/batches/{batch_id})
+BATCH_POLL_INTERVAL = 1.0
+BATCH_POLL_TIMEOUT = 600
+
 st.title("📄 Upload de Documentos para RAG")
 st.markdown("Faça upload de documentos para treinar seus bots com conhecimento específico")
 
@@ -64,10 +69,9 @@ with st.sidebar:
                 docs_response = requests.get(f"{API_URL}/documents/{selected_bot['id']}")
                 documents = docs_response.json() if docs_response.ok else []
                 
-                st.metric("📚 Documentos", len(documents))
-                
-                total_chunks = sum(d.get("chunk_count", 0) for d in documents)
-                st.metric("🧩 Chunks", total_chunks)
+                # Contagens já vêm agregadas na listagem de bots
+                st.metric("📚 Documentos", selected_bot.get("document_count", len(documents)))
+                st.metric("🧩 Chunks", selected_bot.get("chunk_count", 0))
             except:
                 documents = []
         
@@ -129,37 +133,60 @@ if selected_bot:
                 status_text = st.empty()
                 
                 successful_uploads = 0
+                failed_uploads = 0
+                finished = False
                 
-                for idx, file in enumerate(uploaded_files):
-                    try:
-                        status_text.text(f"Uploading {file.name}...")
-                        
-                        # Preparar arquivo para envio
-                        files = {"file": (file.name, file, file.type)}
-                        
-                        # Fazer upload
-                        response = requests.post(
-                            f"{API_URL}/documents/{selected_bot['id']}",
-                            files=files
-                        )
+                try:
+                    status_text.text(f"Enviando {len(uploaded_files)} arquivo(s)...")
+                    
+                    # Todos os arquivos em uma única requisição multipart
+                    files = [("files", (file.name, file, file.type)) for file in uploaded_files]
+                    response = requests.post(
+                        f"{API_URL}/documents/bulk",
+                        data={"bot_id": selected_bot["id"]},
+                        files=files
+                    )
+                    response.raise_for_status()
+                    batch = response.json()
+                    
+                    # O processamento segue em background: acompanha o progresso agregado do lote
+                    deadline = time.monotonic() + BATCH_POLL_TIMEOUT
+                    while True:
+                        response = requests.get(f"{API_URL}/documents/batches/{batch['batch_id']}")
                         response.raise_for_status()
+                        progress = response.json()
                         
-                        successful_uploads += 1
+                        successful_uploads = progress["completed"]
+                        failed_uploads = progress["failed"]
+                        progress_bar.progress(progress["progress"])
+                        status_text.text(
+                            f"Processando: {successful_uploads + failed_uploads}/{progress['total']} "
+                            f"arquivo(s) ({progress['chunk_count']} chunks)"
+                        )
                         
-                    except Exception as e:
-                        st.error(f"❌ Erro ao fazer upload de {file.name}: {str(e)}")
+                        if progress["processing"] == 0:
+                            finished = True
+                            break
+                        if time.monotonic() > deadline:
+                            st.warning("⏳ O processamento continua em background; acompanhe na aba Gerenciar")
+                            break
+                        time.sleep(BATCH_POLL_INTERVAL)
                     
-                    # Atualizar barra de progresso
-                    progress_bar.progress((idx + 1) / len(uploaded_files))
+                except Exception as e:
+                    st.error(f"❌ Erro ao fazer upload: {str(e)}")
+                
+                if failed_uploads > 0:
+                    st.error(f"❌ {failed_uploads} arquivo(s) falharam no processamento")
                 
                 # Mensagem final
                 if successful_uploads > 0:
-                    st.success(f"✅ {successful_uploads} arquivo(s) enviado(s) com sucesso!")
+                    st.success(f"✅ {successful_uploads} arquivo(s) processado(s) com sucesso!")
                     st.balloons()
                     status_text.text("Upload concluído!")
                     
-                    # Limpar cache e recarregar
-                    st.rerun()
+                    # Limpar cache e recarregar (mantém na tela os avisos de falha/timeout)
+                    if failed_uploads == 0 and finished:
+                        st.rerun()
                 else:
                     status_text.text("Upload falhou")
     
@@ -201,7 +228,8 @@ if selected_bot:
                         if status == "completed":
                             st.success("✅ Completo")
                         elif status == "processing":
-                            st.info("⏳ Processando")
+                            stage = (doc.get("ingestion") or {}).get("stage", "queued")
+                            st.info(f"⏳ Processando ({stage})")
                         elif status == "failed":
                             st.error("❌ Erro")
                         else:
@@ -233,6 +261,25 @@ if selected_bot:
                         with col_b:
                             uploaded_at = doc.get('created_at', 'N/A')
                             st.text(f"Upload: {uploaded_at[:19] if uploaded_at != 'N/A' else 'N/A'}")
+                        
+                        # Telemetria da ingestão
+                        ingestion = doc.get("ingestion") or {}
+                        timings = ingestion.get("timings_ms")
+                        if timings:
+                            st.caption(
+                                f"⏱️ Total {timings['total']:.0f} ms · "
+                                f"extração {timings['extract']:.0f} ms · "
+                                f"divisão {timings['split']:.0f} ms · "
+                                f"embeddings {timings['embed']:.0f} ms · "
+                                f"indexação {timings['upsert']:.0f} ms"
+                            )
+                            pages = ingestion.get("pages")
+                            st.caption(
+                                f"{ingestion.get('tokens', 0)} tokens"
+                                + (f" · {pages} páginas" if pages else "")
+                            )
+                        if ingestion.get("error"):
+                            st.caption(f"Erro: {ingestion['error']}")
             
             # Botões de ação
             st.divider()
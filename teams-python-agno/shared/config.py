@@ -20,8 +20,42 @@ class Settings(BaseSettings):
     embedding_model: str = Field(default="text-embedding-3-small", alias="EMBEDDING_MODEL")
     chat_model: str = Field(default="gpt-4-turbo-preview", alias="CHAT_MODEL")
     
+    # Azure OpenAI (corporativo; com USE_AZURE_OPENAI=False usa a OpenAI padrão)
+    use_azure: bool = Field(default=False, alias="USE_AZURE_OPENAI")
+    azure_openai_endpoint: str = Field(default="", alias="AZURE_OPENAI_ENDPOINT")
+    azure_openai_api_key: str = Field(default="", alias="AZURE_OPENAI_API_KEY")
+    azure_openai_api_version: str = Field(default="2024-02-15-preview", alias="AZURE_OPENAI_API_VERSION")
+    azure_chat_deployment: str = Field(default="", alias="AZURE_CHAT_DEPLOYMENT")
+    azure_embedding_deployment: str = Field(default="", alias="AZURE_EMBEDDING_DEPLOYMENT")
+    
+    # HTTP (pool compartilhado com os provedores)
+    http_enable_http2: bool = Field(default=True, alias="HTTP_ENABLE_HTTP2")
+    http_max_connections: int = Field(default=100, alias="HTTP_MAX_CONNECTIONS")
+    http_max_keepalive_connections: int = Field(default=20, alias="HTTP_MAX_KEEPALIVE_CONNECTIONS")
+    http_keepalive_expiry: float = Field(default=60.0, alias="HTTP_KEEPALIVE_EXPIRY")
+    http_timeout: float = Field(default=60.0, alias="HTTP_TIMEOUT")
+    http_connect_timeout: float = Field(default=5.0, alias="HTTP_CONNECT_TIMEOUT")
+    http_warmup_connections: int = Field(default=2, alias="HTTP_WARMUP_CONNECTIONS")
+    
+    # Roteamento entre deployments LLM (lista JSON; vazio = provedor único)
+    llm_router_endpoints: str = Field(default="", alias="LLM_ROUTER_ENDPOINTS")
+    llm_router_hedging: bool = Field(default=True, alias="LLM_ROUTER_HEDGING")
+    llm_router_hedge_default: float = Field(default=5.0, alias="LLM_ROUTER_HEDGE_DEFAULT")
+    llm_router_ewma_alpha: float = Field(default=0.2, alias="LLM_ROUTER_EWMA_ALPHA")
+    llm_router_max_error_rate: float = Field(default=0.5, alias="LLM_ROUTER_MAX_ERROR_RATE")
+    llm_router_cooldown: float = Field(default=30.0, alias="LLM_ROUTER_COOLDOWN")
+    llm_coalescing_enabled: bool = Field(default=True, alias="LLM_COALESCING_ENABLED")
+    
     # AgentOps
     agentops_api_key: str = Field(alias="AGENTOPS_API_KEY")
+    # agentops | noop (noop desliga o tracing, ex. em testes de carga)
+    tracing_mode: str = Field(default="agentops", alias="TRACING_MODE")
+    tracing_sample_rate: float = Field(default=1.0, alias="TRACING_SAMPLE_RATE")
+    tracing_queue_size: int = Field(default=1000, alias="TRACING_QUEUE_SIZE")
+    tracing_batch_size: int = Field(default=100, alias="TRACING_BATCH_SIZE")
+    tracing_flush_interval: float = Field(default=1.0, alias="TRACING_FLUSH_INTERVAL")
+    # Instrumentação automática das chamadas ao LLM pelo AgentOps (não respeita a amostragem)
+    tracing_instrument_llm: bool = Field(default=False, alias="TRACING_INSTRUMENT_LLM")
     
     # ChromaDB
     chromadb_host: str = Field(default="localhost", alias="CHROMADB_HOST")
@@ -32,11 +66,82 @@ class Settings(BaseSettings):
     api_host: str = Field(default="0.0.0.0", alias="API_HOST")
     api_port: int = Field(default=8000, alias="API_PORT")
     api_reload: bool = Field(default=True, alias="API_RELOAD")
+    # Processos uvicorn (> 1 desliga o reload, ativa o índice FAISS compartilhado e exige VECTOR_STORE != chromadb)
+    api_workers: int = Field(default=1, alias="API_WORKERS")
+    # Token exigido no header X-Admin-Token pelos endpoints /api/admin (vazio = endpoints desativados)
+    admin_token: str = Field(default="", alias="ADMIN_TOKEN")
+    # Serviços pesados (Chroma, LangChain, OpenAI): startup | background | none (primeiro uso)
+    service_warm_up: str = Field(default="background", alias="SERVICE_WARM_UP")
+    
+    # Vector store (adaptadores v2): chromadb | faiss | qdrant
+    vector_store: str = Field(default="chromadb", alias="VECTOR_STORE")
+    faiss_index_path: str = Field(default="./data/faiss", alias="FAISS_INDEX_PATH")
+    # Vetores em arquivos mmap compartilhados entre processos (sempre ativo com API_WORKERS > 1)
+    faiss_shared_index: bool = Field(default=False, alias="FAISS_SHARED_INDEX")
+    
+    # Change feed: invalidação de caches e índices entre workers
+    change_feed_poll_interval: float = Field(default=0.2, alias="CHANGE_FEED_POLL_INTERVAL")
+    change_feed_max_bytes: int = Field(default=1048576, alias="CHANGE_FEED_MAX_BYTES")
     
     # RAG
     chunk_size: int = Field(default=1000, alias="CHUNK_SIZE")
     chunk_overlap: int = Field(default=200, alias="CHUNK_OVERLAP")
     max_chunks_per_query: int = Field(default=5, alias="MAX_CHUNKS_PER_QUERY")
+    ingestion_max_concurrency: int = Field(default=8, alias="INGESTION_MAX_CONCURRENCY")
+    embedding_max_concurrency: int = Field(default=4, alias="EMBEDDING_MAX_CONCURRENCY")
+    embedding_batch_max_size: int = Field(default=64, alias="EMBEDDING_BATCH_MAX_SIZE")
+    embedding_batch_max_wait_ms: float = Field(default=5.0, alias="EMBEDDING_BATCH_MAX_WAIT_MS")
+    context_token_budget: int = Field(default=2000, alias="CONTEXT_TOKEN_BUDGET")
+    context_min_trim_tokens: int = Field(default=64, alias="CONTEXT_MIN_TRIM_TOKENS")
+    
+    # Re-ranking por diversidade (MMR)
+    enable_mmr: bool = Field(default=False, alias="ENABLE_MMR")
+    mmr_lambda: float = Field(default=0.7, alias="MMR_LAMBDA")
+    mmr_fetch_k: int = Field(default=20, alias="MMR_FETCH_K")
+    
+    # Cache semântico de respostas
+    semantic_cache_enabled: bool = Field(default=True, alias="SEMANTIC_CACHE_ENABLED")
+    semantic_cache_threshold: float = Field(default=0.95, alias="SEMANTIC_CACHE_THRESHOLD")
+    semantic_cache_max_entries: int = Field(default=256, alias="SEMANTIC_CACHE_MAX_ENTRIES")
+    semantic_cache_ttl: float = Field(default=3600, alias="SEMANTIC_CACHE_TTL")
+    
+    # Memória de conversa (multi-turno)
+    memory_enabled: bool = Field(default=True, alias="MEMORY_ENABLED")
+    memory_max_turns: int = Field(default=6, alias="MEMORY_MAX_TURNS")
+    memory_token_budget: int = Field(default=1500, alias="MEMORY_TOKEN_BUDGET")
+    memory_summarize_every: int = Field(default=2, alias="MEMORY_SUMMARIZE_EVERY")
+    memory_summary_max_tokens: int = Field(default=300, alias="MEMORY_SUMMARY_MAX_TOKENS")
+    memory_summary_model: str = Field(default="", alias="MEMORY_SUMMARY_MODEL")
+    
+    # Gravação do histórico em lote
+    history_max_buffer: int = Field(default=10000, alias="HISTORY_MAX_BUFFER")
+    history_batch_size: int = Field(default=200, alias="HISTORY_BATCH_SIZE")
+    history_flush_interval: float = Field(default=0.5, alias="HISTORY_FLUSH_INTERVAL")
+    history_max_retries: int = Field(default=3, alias="HISTORY_MAX_RETRIES")
+    
+    # Cache de configuração dos bots
+    bot_cache_ttl: float = Field(default=300, alias="BOT_CACHE_TTL")
+    
+    # Busca federada (várias collections em paralelo)
+    federated_search_timeout: float = Field(default=2.0, alias="FEDERATED_SEARCH_TIMEOUT")
+    federated_max_concurrency: int = Field(default=32, alias="FEDERATED_MAX_CONCURRENCY")
+    
+    # Métricas (Prometheus)
+    metrics_enabled: bool = Field(default=True, alias="METRICS_ENABLED")
+    event_loop_lag_interval: float = Field(default=0.5, alias="EVENT_LOOP_LAG_INTERVAL")
+    # Streaming da resposta do LLM: mede time-to-first-token (tokens contados localmente com tiktoken)
+    llm_streaming: bool = Field(default=False, alias="LLM_STREAMING")
+    
+    # Diagnóstico: detector de chamadas bloqueantes no event loop (staging)
+    blocking_detector_enabled: bool = Field(default=False, alias="BLOCKING_DETECTOR_ENABLED")
+    blocking_threshold_ms: float = Field(default=100, alias="BLOCKING_THRESHOLD_MS")
+    blocking_max_sites: int = Field(default=200, alias="BLOCKING_MAX_SITES")
+    
+    # Profiler por amostragem (/api/admin/profile e header X-Profile)
+    profiling_enabled: bool = Field(default=False, alias="PROFILING_ENABLED")
+    profiling_interval_ms: float = Field(default=5, alias="PROFILING_INTERVAL_MS")
+    profiling_max_seconds: float = Field(default=60, alias="PROFILING_MAX_SECONDS")
+    profiling_max_stored: int = Field(default=50, alias="PROFILING_MAX_STORED")
     
     # Logging
     log_level: str = Field(default="INFO", alias="LOG_LEVEL")